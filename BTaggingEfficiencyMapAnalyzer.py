@@ -1,24 +1,41 @@
+import time
+# time spent before processing (imports, ROOT and C++ helpers), reported in the job log and in the profiles
+START_TIME = time.time()
+
 import os, sys
 import re
+import json
+import glob
+import hashlib
 from argparse import ArgumentParser
 
-import yaml
-from yaml.loader import SafeLoader
+from btagging_metadata import load_yaml
+from btagging_manifest import hashing_config, fingerprinting_inputs, is_up_to_date, recording_output, removing_manifest, \
+    superseded_outputs, removing_output
+from btagging_threads import detecting_n_threads
+from btagging_profiling import StageProfiler, writing_profile
+from btagging_build import loading_compiled_header
 
 from array import array
 
 from collections import OrderedDict
 
-import ROOT
-ROOT.ROOT.EnableImplicitMT()
+# imported by setting_up_root() when the processing starts
+ROOT = None
+STARTUP = OrderedDict()
+IMPORTS_TIME = time.time() - START_TIME
+
+# both can be overridden from the environment (e.g. by the benchmark in benchmark/)
+ROOT_DIR = os.environ.get('BTAGGING_ROOT_DIR', '/afs/desy.de/user/g/gmilella/ttX3_post_ntuplization_analysis/ttX_analysis/')
 
-ROOT_DIR = '/afs/desy.de/user/g/gmilella/ttX3_post_ntuplization_analysis/ttX_analysis/'
+XSEC_FILE = '{}/xsec.yaml'.format(ROOT_DIR)
+SUM_GEN_WEIGHTS_FILE = os.environ.get('BTAGGING_SUM_GEN_WEIGHTS_FILE',
+                                      "/nfs/dust/cms/user/gmilella/ttX_ntuplizer/bkg_{year}_hotvr/merged/sum_gen_weights.yaml")
 
 cpp_functions_header = "{}/cpp_functions_header.h".format(ROOT_DIR)
-if not os.path.isfile(cpp_functions_header):
-    print('No cpp header found!')
-    sys.exit()
-ROOT.gInterpreter.Declare('#include "{}"'.format(cpp_functions_header))
+
+# compiled helpers splitting the jet collections by flavour
+btagging_helpers_header = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'btagging_helpers.h')
 
 LUMINOSITY = {
     '2018': 59830, '2017': 41480,
@@ -26,6 +43,12 @@ LUMINOSITY = {
 }
 
 LEPTON_SELECTION = ['ee', 'emu', 'mumu']
+
+# same order as btagging::kFlavours in btagging_helpers.h
+JET_FLAVORS = OrderedDict()
+JET_FLAVORS['b'] = 5
+JET_FLAVORS['c'] = 4
+JET_FLAVORS['udsg'] = 0
 ELECTRON_ID_TYPE = "MVA"
 LEPTON_ID = "loose"
 
@@ -63,44 +86,80 @@ VARIABLES_BINNING = OrderedDict()
 VARIABLES_BINNING['pt'] = [20, 30, 50, 70, 100, 140, 200, 300, 600, 1000]
 VARIABLES_BINNING['eta'] = [0, 0.5, 1.0, 1.5, 2.5]
 
+# finer binning (containing all the edges above), to be merged by
+# makeBTaggingEfficiencyMap.py --min_effective_entries according to the statistics
+FINE_VARIABLES_BINNING = OrderedDict()
+FINE_VARIABLES_BINNING['pt'] = [20, 25, 30, 35, 40, 45, 50, 60, 70, 80, 90, 100, 120, 140, 170, 200, 250, 300, 400, 500, 600, 800, 1000]
+FINE_VARIABLES_BINNING['eta'] = [round(0.1 * i, 1) for i in range(26)]
+
 EVENT_SELECTION = 'after2OS'
+# events entering at least one of the lepton selections
+ANY_EVENT_SELECTION = ' || '.join("eventSelection_{}_cut".format(lepton_selection) for lepton_selection in LEPTON_SELECTION)
+
+# jet collections: selectedJets_{variation}_* and selectedBJets_{variation}_{WP}_*
+# the nominal histograms are stored in the lepton selection directories,
+# the ones of the variations (e.g. jesUp, jerDown) in {variation}/{lepton selection}
+NOMINAL_VARIATION = 'nominal'
+
+# each block of entries processed with --checkpoint_entries builds its own graph and pays
+# the just-in-time compilation again (seconds): smaller blocks are raised to this size
+MIN_CHECKPOINT_ENTRIES = 1000000
+
+# 'histos': separate TH1/TH2 per lepton selection, flavor and WP
+# 'cube': one pt x eta x flavor x WP x lepton selection THnD per process
+OUTPUT_FORMATS = ['histos', 'cube']
 
 class Processor:
-    def __init__(self, input_file, output_dir, year):
+    def __init__(self, input_file, output_dir, year, output_format='histos', weighted=False, variations=None, fine_binning=False,
+                 incremental=False, cache_dir=None, checkpoint_entries=0):
+
+        setting_up_root()
 
-        self.input_file = input_file
+        # a single file or a list of chunks of the same process,
+        # which are processed together as one chained dataset
+        if isinstance(input_file, (list, tuple)):
+            self.input_files = list(input_file)
+        else:
+            self.input_files = [input_file]
+        self.input_file = self.input_files[0]
         self.output_dir = output_dir
         self.year = year
+        self.output_format = output_format
+        self.weighted = weighted
+        self.variables_binning = FINE_VARIABLES_BINNING if fine_binning else VARIABLES_BINNING
+        # all the variations are booked on the same graph (one event loop)
+        self.variations = [NOMINAL_VARIATION] + [var for var in (variations or []) if var != NOMINAL_VARIATION]
         self.lepton_selection = LEPTON_SELECTION
-
-        self.process_name = self._parsing_file()
-        self.xsec = self._xsec()
-        self.sum_gen_weights = self._sum_gen_weights()
-        self.output_file = self._creation_output_file() 
+        self.incremental = incremental
+        self.cache_dir = cache_dir
+        if 0 < checkpoint_entries < MIN_CHECKPOINT_ENTRIES:
+            print("Blocks of {} entries raised to {} (graph and just-in-time compilation per block)".format(
+                checkpoint_entries, MIN_CHECKPOINT_ENTRIES))
+            checkpoint_entries = MIN_CHECKPOINT_ENTRIES
+        self.checkpoint_entries = checkpoint_entries
+        # wall/cpu time of each stage, stored in {output}.profile.json
+        self.profiler = StageProfiler()
+
+        with self.profiler.stage('metadata'):
+            self.process_name = self._parsing_file()
+            self.xsec = self._xsec()
+            self.sum_gen_weights = self._sum_gen_weights()
+        self.output_path = naming_output_file(self.input_files, self.process_name, self.output_dir, self.year)
+        # the normalization enters the histograms only when weighted
+        self.config_hash = hashing_config(analyzer_config(
+            self.year, output_format, weighted, variations, fine_binning,
+            normalization=[self.xsec, self.sum_gen_weights] if weighted else None))
+        self.output_file = None
 
 
     def _parsing_file(self):
-        print("Processing file: {}".format(self.input_file))
-        pattern = re.compile(r"merged\/(.*?)_MC")
-        match = pattern.search(str(self.input_file))
-        if match:
-            print("Process name: {}".format(match.group(1)))
-            return match.group(1)
-        else:
-            pattern = re.compile(r"merged\/(.*?)_ntuplizer")
-            match = pattern.search(str(self.input_file))
-            if match:
-                print("Process name: {}".format(match.group(1)))
-                return match.group(1)
-            else:
-                pattern = re.compile(r"merged\/(.*?)_output")
-                match = pattern.search(str(self.input_file))
-                if match:
-                    print("Process name: {}".format(match.group(1)))
-                    return match.group(1)
-                else:
-                    print("No process name found.")
-                    sys.exit()
+        process_names = set(parsing_file(str(input_file)) for input_file in self.input_files)
+        if len(process_names) > 1:
+            print("Input files belong to different processes: {}".format(sorted(process_names)))
+            sys.exit(1)
+        process_name = process_names.pop()
+        print("Process name: {}".format(process_name))
+        return process_name
 
     def _xsec(self):
         process_name = self.process_name
@@ -108,13 +167,13 @@ class Processor:
         #     pattern = r"_width\d+"
         #     process_name = re.sub(pattern, '', self.process_name, flags=re.I)
 
-        with open('{}/xsec.yaml'.format(ROOT_DIR)) as xsec_file:
-            xsecFile = yaml.load(xsec_file, Loader=SafeLoader)
+        # parsed once per session (and cached locally across jobs)
+        xsecFile = load_yaml(XSEC_FILE)
         if xsecFile[process_name]['isUsed']:
             return xsecFile[process_name]['xSec']
         else:
             print("Xsec for process {} not found in file".format(process_name))
-            sys.exit()
+            sys.exit(1)
 
     def _sum_gen_weights(self):
         # if self.is_sgn:
@@ -122,114 +181,398 @@ class Processor:
         #     sumgenweight = root_file.Get("sumGenWeights")
         #     return sumgenweight.GetVal()
         # else:
-        with open("/nfs/dust/cms/user/gmilella/ttX_ntuplizer/bkg_{}_hotvr/merged/sum_gen_weights.yaml".format(self.year)) as sumGenWeights_file:
-            sumGenWeightsFile = yaml.load(sumGenWeights_file, Loader=SafeLoader)
-            return sumGenWeightsFile[self.process_name]
+        sumGenWeightsFile = load_yaml(SUM_GEN_WEIGHTS_FILE.format(year=self.year))
+        return sumGenWeightsFile[self.process_name]
 
     def _creation_output_file(self):
-        # bkg samples are divided in chunks
-        # so the output files should reflect this division
-        match = re.search(r'([^/]+)\.root$', str(self.input_file))
-        if match: 
-            process_filename = match.group(1)
-        else:
-            print("File name not extracted properly...")
-            sys.exit()
-
         # check if dir exist
-        output_dir_path = os.path.join(self.output_dir, str(self.year), EVENT_SELECTION)
+        output_dir_path = os.path.dirname(self.output_path)
         if not os.path.exists(output_dir_path):
             os.makedirs(output_dir_path)
 
-        output_path = os.path.join(output_dir_path, "{}_BTaggingEfficiencyMapAnalyzer_output_{}.root".format(process_filename, EVENT_SELECTION))
-
-        file_out = ROOT.TFile(output_path, 'RECREATE')
-        for lep_sel in ['emu', 'ee', 'mumu']:
-            ROOT.gDirectory.mkdir(lep_sel)
-            file_out.cd()
+        # the manifest of a previous run is only valid for the previous output
+        removing_manifest(self.output_path)
+        # written next to the output and renamed once complete
+        self.output_tmp_path = "{}.{}.tmp".format(self.output_path, os.getpid())
+        file_out = ROOT.TFile(self.output_tmp_path, 'RECREATE')
+        for variation in self.variations:
+            variation_dir = file_out if variation == NOMINAL_VARIATION else file_out.mkdir(variation)
+            if self.output_format == 'histos':
+                for lep_sel in ['emu', 'ee', 'mumu']:
+                    variation_dir.mkdir(lep_sel)
+                    file_out.cd()
         print("Output file {}: ".format(file_out))
         return file_out
 
+    def is_up_to_date(self):
+        return is_up_to_date(self.output_path, self.input_files, self.config_hash)
+
     def process(self):
-        root_df = ROOT.RDataFrame("Friends", str(self.input_file))
+        if self.incremental and self.is_up_to_date():
+            print("Output {} up to date: skipped".format(self.output_path))
+            return
+        bytes_read_start = ROOT.TFile.GetFileBytesRead()
+        with self.profiler.stage('output_file'):
+            self.output_file = self._creation_output_file()
+
+        # skim of the needed columns (--cache_dir): read instead of the inputs if already written
+        cache_path = self._naming_cache_file() if self.cache_dir else None
+        chain_files = [cache_path] if cache_path and os.path.exists(cache_path) else self.input_files
+        if cache_path and chain_files is not self.input_files:
+            print("Reading the cached columns from {}".format(cache_path))
+        print("Number of input files: {}".format(len(chain_files)))
         print("Process: {}, XSec: {} pb, Sum of gen weights: {}".format(self.process_name, self.xsec, self.sum_gen_weights))
-        # root_df = root_df.Define("event_weight", 
-                                #  "genweight * puWeight * {} / {} * {}".format(self.xsec, self.sum_gen_weights, LUMINOSITY[str(self.year)]))
+
+        cache_snapshot = None
+        if self.checkpoint_entries > 0:
+            if cache_path and chain_files is self.input_files:
+                print("The skim is not written when processing in blocks")
+            histos, n_events, event_loops = self._processing_in_blocks(chain_files)
+        else:
+            with self.profiler.stage('graph'):
+                root_df = self._creating_dataframe(chain_files)
+                n_events = root_df.Count()
+                if cache_path and chain_files is self.input_files:
+                    root_df, cache_snapshot = self._booking_cache_snapshot(root_df, cache_path)
+                # all the histograms are booked first (lazily) and filled afterwards
+                # in a single event loop shared by all the lepton selections
+                histos = self._booking_graph(root_df)
+
+            # the just-in-time compilation of the graph happens at the start of the event loop,
+            # its time (from the RDataFrame log) is then moved to the 'jit' stage
+            with self.profiler.stage('event_loop'):
+                jit_time = self._running_event_loop(histos, [n_events] + ([cache_snapshot] if cache_snapshot else []))
+            if jit_time is not None:
+                self.profiler.split('event_loop', 'jit', jit_time)
+            if cache_snapshot:
+                # the skim is complete: visible to the next runs
+                os.rename(self.cache_tmp_path, cache_path)
+                print("Cached columns stored in {}".format(cache_path))
+            n_events = n_events.GetValue()
+            event_loops = root_df.GetNRuns() if hasattr(root_df, 'GetNRuns') else None
+
+        with self.profiler.stage('write'):
+            self._writing_histos(histos)
+        # the output is complete: moved to its final path and recorded with its inputs and configuration
+        os.rename(self.output_tmp_path, self.output_path)
+        recording_output(self.output_path, self.input_files, self.config_hash, process=self.process_name)
+        # outputs of a previous grouping of these chunks would be merged with this one by the map-maker
+        for superseded_path in superseded_outputs(self.output_path, self.input_files, self.process_name):
+            print("Removing {}: its inputs are (partly) processed in {}".format(superseded_path, self.output_path))
+            removing_output(superseded_path)
+        if os.path.exists(naming_checkpoint(self.output_path)):
+            os.remove(naming_checkpoint(self.output_path))
+
+        self.profiler.info.update([
+            ('output', self.output_path),
+            ('process', self.process_name),
+            ('input_files', len(self.input_files)),
+            ('threads', ROOT.ROOT.GetThreadPoolSize() if ROOT.ROOT.IsImplicitMTEnabled() else 1),
+            ('events', n_events),
+            ('event_loops', event_loops),
+            ('bytes_read', ROOT.TFile.GetFileBytesRead() - bytes_read_start),
+            ('cache', None if not cache_path else 'written' if cache_snapshot else 'read'),
+            ('startup', STARTUP),
+        ])
+        writing_profile(self.output_path, self.profiler.report())
+
+    def _creating_dataframe(self, chain_files, entry_range=None):
+        if entry_range is None:
+            # all the chunks are chained, so that implicit MT balances the load across files
+            self.chain = ROOT.TChain("Friends")
+            for input_file in chain_files:
+                self.chain.Add(str(input_file))
+            return ROOT.RDataFrame(self.chain)
+
+        if hasattr(ROOT.RDF.Experimental, 'RSample'):
+            # global entry range of the chained files, processed with implicit MT (ROOT >= 6.30)
+            dataset_spec = ROOT.RDF.Experimental.RDatasetSpec()
+            dataset_spec.AddSample(ROOT.RDF.Experimental.RSample(
+                self.process_name, "Friends", ROOT.std.vector('string')([str(input_file) for input_file in chain_files])))
+            dataset_spec.WithGlobalRange(ROOT.RDF.Experimental.RDatasetSpec.REntryRange(*entry_range))
+            return ROOT.RDataFrame(dataset_spec)
+
+        # Range is only supported by sequential event loops
+        if ROOT.ROOT.IsImplicitMTEnabled():
+            print("Processing in blocks with implicit MT needs ROOT >= 6.30: use --n_threads 1 or --checkpoint_entries 0")
+            sys.exit(1)
+        return self._creating_dataframe(chain_files).Range(*entry_range)
+
+    def _booking_graph(self, root_df):
+        if self.weighted:
+            # sum of squared weights tracked by all the histograms
+            ROOT.TH1.SetDefaultSumw2(True)
+            root_df = root_df.Define("event_weight", 
+                                     "genweight * puWeight * {} / {} * {}".format(self.xsec, self.sum_gen_weights, LUMINOSITY[str(self.year)]))
 
         # adding new columns
         root_df = self._adding_new_columns(root_df)
 
-        for lepton_selection in LEPTON_SELECTION:
-            print('\nLepton Selection: {}'.format(lepton_selection))
+        return self._booking_histos(root_df)
+
+    def _processing_in_blocks(self, chain_files):
+        # the entries are processed in blocks of checkpoint_entries: after each block, the sum of the histograms
+        # of the processed blocks is checkpointed with the number of processed entries, and a restarted job resumes from there
+        # each block is a new dataframe (an entry range cannot be moved on a booked graph): the chain is opened again and
+        # the graph is built and compiled just in time again, recorded in the 'graph' and 'jit' stages of the profile
+        checkpoint_path = naming_checkpoint(self.output_path)
+        checkpoint_key = hashing_config(OrderedDict([
+            ('config', self.config_hash),
+            ('inputs', fingerprinting_inputs(chain_files)),
+            ('checkpoint_entries', self.checkpoint_entries),
+        ]))
+        chain = ROOT.TChain("Friends")
+        for input_file in chain_files:
+            chain.Add(str(input_file))
+        n_entries = chain.GetEntries()
+
+        histos, first_entry = reading_checkpoint(checkpoint_path, checkpoint_key)
+        if first_entry:
+            print("Resuming from {}: {} of {} entries already processed".format(checkpoint_path, first_entry, n_entries))
+        self.profiler.info['resumed_from_entry'] = first_entry
+
+        blocks = [(begin, min(begin + self.checkpoint_entries, n_entries)) for begin in range(first_entry, n_entries, self.checkpoint_entries)]
+        if histos is None and not blocks:
+            # empty inputs: one event loop for the (empty) histograms
+            blocks = [None]
+
+        n_events, event_loops = 0, 0
+        for block in blocks:
+            with self.profiler.stage('graph'):
+                root_df = self._creating_dataframe(chain_files, block)
+                block_events = root_df.Count()
+                booked_histos = self._booking_graph(root_df)
+            with self.profiler.stage('event_loop'):
+                jit_time = self._running_event_loop(booked_histos, [block_events])
+            if jit_time is not None:
+                self.profiler.split('event_loop', 'jit', jit_time)
+            histos = adding_results(histos, booked_histos)
+            n_events += block_events.GetValue()
+            event_loops += 1
+
+            with self.profiler.stage('checkpoint'):
+                writing_checkpoint(checkpoint_path, histos, block[1] if block else n_entries, checkpoint_key)
+            if block:
+                print("Entries {}-{} of {} processed".format(block[0], block[1], n_entries))
+        return histos, n_events, event_loops
+
+    def _required_columns(self):
+        # input columns read by the graph
+        columns = ["eventSelection_{}_cut".format(lepton_selection) for lepton_selection in LEPTON_SELECTION]
+        for variation in self.variations:
+            jet_collections = ['selectedJets_{}'.format(variation)]
+            jet_collections += ['selectedBJets_{}_{}'.format(variation, WP) for WP in B_TAGGING_WP[str(self.year)].keys()]
+            columns += ["{}_{}".format(jet_collection, var) for jet_collection in jet_collections for var in ['pt', 'eta', 'hadronFlavour']]
+        if self.weighted:
+            columns += ['genweight', 'puWeight'] + weight_columns()
+        return columns
+
+    def _naming_cache_file(self):
+        # keyed on the inputs (path, size, modification time) and on the cached columns
+        cache_key = hashing_config(OrderedDict([
+            ('inputs', fingerprinting_inputs(self.input_files)),
+            ('columns', sorted(self._required_columns())),
+            ('selection', ANY_EVENT_SELECTION),
+        ]))
+        return os.path.join(self.cache_dir, "{}_{}_{}.root".format(self.process_name, len(self.input_files), cache_key[:16]))
+
+    def _booking_cache_snapshot(self, root_df, cache_path):
+        # only the events passing one of the lepton selections are cached, with a fast compression;
+        # the snapshot is lazy: written in the same event loop as the histograms
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        root_df = root_df.Filter(ANY_EVENT_SELECTION, "any_os_dilepton_selection")
+
+        snapshot_options = ROOT.RDF.RSnapshotOptions()
+        snapshot_options.fLazy = True
+        snapshot_options.fCompressionAlgorithm = ROOT.ROOT.RCompressionSetting.EAlgorithm.kLZ4
+        snapshot_options.fCompressionLevel = 1
+        # written next to the cache and renamed once complete, so that concurrent jobs never read a partial skim
+        self.cache_tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        print("Caching {} columns in {}".format(len(self._required_columns()), cache_path))
+        cache_snapshot = root_df.Snapshot("Friends", self.cache_tmp_path, ROOT.std.vector('string')(self._required_columns()), snapshot_options)
+        return root_df, cache_snapshot
+
+    def _naming_output_dir(self, variation, lepton_selection=''):
+        if variation == NOMINAL_VARIATION:
+            return lepton_selection
+        return '/'.join([variation, lepton_selection]) if lepton_selection else variation
+
+    def _booking_histos(self, root_df):
+        # {output directory: [histograms]}
+        booked_histos = OrderedDict()
+        if self.output_format == 'cube':
+            cube_model = self._creation_efficiency_cube_model()
+
+        for i_lepton_selection, lepton_selection in enumerate(LEPTON_SELECTION):
             root_df_filtered = self._event_selection(root_df, lepton_selection=lepton_selection)
 
-            self.output_file.cd(lepton_selection)
+            # the weight of the lepton selection is defined once per filtered branch
+            # and used by all the histograms, which are still filled in the same event loop
+            weight_column = []
+            if self.weighted:
+                root_df_filtered = root_df_filtered.Define("lepton_selection_weight", "double({})".format(WEIGHTS_DICT[lepton_selection]))
+                weight_column = ["lepton_selection_weight"]
+
+            for variation in self.variations:
+                histos = booked_histos[self._naming_output_dir(variation, lepton_selection)] = []
+                if self.weighted and self.output_format == 'histos':
+                    root_df_filtered = self._defining_jet_weights(root_df_filtered, variation)
+
+                if self.output_format == 'cube':
+                    # one action per event filling all flavors and WPs of the lepton selection
+                    histos.append(ROOT.btagging.BookEfficiencyCube(
+                        ROOT.RDF.AsRNode(root_df_filtered), cube_model, i_lepton_selection,
+                        "efficiency_cube_entries_{}".format(variation), *weight_column))
+                    continue
+
+                for flavor_type in JET_FLAVORS.keys():
+                    histos.append(root_df_filtered.Histo2D(
+                        ("{}_ak4_flavor_{}_etaVSpt_{}_{}".format(self.process_name, flavor_type, EVENT_SELECTION, lepton_selection), '',
+                         len(self.variables_binning['pt']) - 1, array('d', self.variables_binning['pt']),
+                         len(self.variables_binning['eta']) - 1, array('d', self.variables_binning['eta'])),
+                        "selectedJets_{}_flavor_{}_pt".format(variation, flavor_type),
+                        "selectedJets_{}_flavor_{}_eta".format(variation, flavor_type),
+                        *jet_weight_column("selectedJets_{}_flavor_{}".format(variation, flavor_type), self.weighted)
+                    ))
 
-            for flavor_type, flavor in zip(['b', 'c', 'udsg'], [5, 4, 0]):
-                print("FLAVOR: ", flavor)
+                    for WP in B_TAGGING_WP[str(self.year)].keys():
+                        histos.append(root_df_filtered.Histo2D(
+                            ("{}_ak4_btagged_WP_{}_flavor_{}_etaVSpt_{}_{}".format(self.process_name, WP, flavor_type, EVENT_SELECTION, lepton_selection), '',
+                            len(self.variables_binning['pt']) - 1, array('d', self.variables_binning['pt']),
+                            len(self.variables_binning['eta']) - 1, array('d', self.variables_binning['eta'])),
+                            "selectedBJets_{}_{}_flavor_{}_pt".format(variation, WP, flavor_type),
+                            "selectedBJets_{}_{}_flavor_{}_eta".format(variation, WP, flavor_type),
+                            *jet_weight_column("selectedBJets_{}_{}_flavor_{}".format(variation, WP, flavor_type), self.weighted)
+                        ))
+
+                    for var in self.variables_binning.keys():
+                        histos.append(root_df_filtered.Histo1D(
+                            ("{}_ak4_flavor_{}_{}_{}_{}".format(self.process_name, flavor_type, var, EVENT_SELECTION, lepton_selection), '', 
+                             len(self.variables_binning[var]) - 1, array('d', self.variables_binning[var])),
+                            "selectedJets_{}_flavor_{}_{}".format(variation, flavor_type, var),
+                            *jet_weight_column("selectedJets_{}_flavor_{}".format(variation, flavor_type), self.weighted)
+                        ))
+                        for WP in B_TAGGING_WP[str(self.year)].keys():
+                            histos.append(root_df_filtered.Histo1D(
+                                ("{}_ak4_btagged_WP_{}_flavor_{}_{}_{}_{}".format(self.process_name, WP, flavor_type, var, EVENT_SELECTION, lepton_selection), '', 
+                                 len(self.variables_binning[var]) - 1, array('d', self.variables_binning[var])),
+                                "selectedBJets_{}_{}_flavor_{}_{}".format(variation, WP, flavor_type, var),
+                                *jet_weight_column("selectedBJets_{}_{}_flavor_{}".format(variation, WP, flavor_type), self.weighted)
+                            ))
+
+        return booked_histos
+
+    def _defining_jet_weights(self, root_df, variation):
+        # the weight of the lepton selection repeated for each jet of the per-flavour collections:
+        # the histograms of collection values are filled with collection weights of the same length,
+        # a scalar weight with collection values is not supported by older ROOT (6.20 of CMSSW_11_1_7)
+        jet_collections = ['selectedJets_{}'.format(variation)]
+        jet_collections += ['selectedBJets_{}_{}'.format(variation, WP) for WP in B_TAGGING_WP[str(self.year)].keys()]
+        for jet_collection in jet_collections:
+            for flavor_type in JET_FLAVORS.keys():
+                jets = "{}_flavor_{}".format(jet_collection, flavor_type)
+                root_df = root_df.Define(jet_weight_column(jets, True)[0],
+                                         "btagging::JetWeights({}_pt, lepton_selection_weight)".format(jets))
+        return root_df
 
-                histo_output = root_df_filtered.Histo2D(
-                    ("{}_ak4_flavor_{}_etaVSpt_{}_{}".format(self.process_name, flavor_type, EVENT_SELECTION, lepton_selection), '',
-                     len(VARIABLES_BINNING['pt']) - 1, array('d', VARIABLES_BINNING['pt']),
-                     len(VARIABLES_BINNING['eta']) - 1, array('d', VARIABLES_BINNING['eta'])),
-                    "selectedJets_nominal_flavor_{}_pt".format(flavor_type),
-                    "selectedJets_nominal_flavor_{}_eta".format(flavor_type)
-                )
+    def _running_event_loop(self, booked_histos, other_results=None):
+        all_histos = [histo for histos in booked_histos.values() for histo in histos]
+        print("Running the event loop for {} booked histograms".format(len(all_histos)))
+        # the RDataFrame log (ROOT >= 6.24) gives the time of the just-in-time compilation, returned (None otherwise)
+        log_recorder = ROOT.btagging.RDFLogRecorder() if hasattr(ROOT.btagging, 'RDFLogRecorder') else None
+        if hasattr(ROOT.RDF, 'RunGraphs'):
+            ROOT.RDF.RunGraphs(all_histos + list(other_results or []))
+        else:
+            # ROOT < 6.24: all the histograms belong to the same computation graph,
+            # so accessing one of them fills all the others as well
+            all_histos[0].GetValue()
+        if log_recorder is None: return None
+        log_recorder.Stop()
+        return parsing_jit_time([str(message) for message in log_recorder.Messages()])
+
+    def _creation_efficiency_cube_model(self):
+        wps = ['no_btagged'] + list(B_TAGGING_WP[str(self.year)].keys())
+        axes = [
+            ('pt', self.variables_binning['pt'], None),
+            ('eta', self.variables_binning['eta'], None),
+            ('flavor', None, list(JET_FLAVORS.keys())),
+            ('WP', None, wps),
+            ('lepton_selection', None, LEPTON_SELECTION),
+        ]
+        n_bins = array('i', [len(edges) - 1 if edges else len(labels) for _, edges, labels in axes])
+        x_min = array('d', [edges[0] if edges else 0. for _, edges, labels in axes])
+        x_max = array('d', [edges[-1] if edges else float(len(labels)) for _, edges, labels in axes])
+
+        cube = ROOT.THnD("{}_ak4_efficiencyCube_{}".format(self.process_name, EVENT_SELECTION), '',
+                         len(axes), n_bins, x_min, x_max)
+        for i_axis, (axis_name, edges, labels) in enumerate(axes):
+            axis = cube.GetAxis(i_axis)
+            axis.SetName(axis_name)
+            if edges:
+                axis.Set(len(edges) - 1, array('d', edges))
+            else:
+                for i_label, label in enumerate(labels):
+                    axis.SetBinLabel(i_label + 1, label)
+        cube.Sumw2()
+        return cube
+
+    def _writing_histos(self, booked_histos):
+        if self.output_format == 'cube':
+            self._writing_efficiency_cube(booked_histos)
+            return
+
+        for output_dir_name, histos in booked_histos.items():
+            print('\nLepton Selection: {}'.format(output_dir_name))
+            self.output_file.cd(output_dir_name)
+            for histo_output in histos:
                 histo_output.Write()
-                print("Tot 2D: {}".format(histo_output.Integral()))
-
-                for WP in B_TAGGING_WP[str(self.year)].keys():
-                    histo_output = root_df_filtered.Histo2D(
-                        ("{}_ak4_btagged_WP_{}_flavor_{}_etaVSpt_{}_{}".format(self.process_name, WP, flavor_type, EVENT_SELECTION, lepton_selection), '',
-                        len(VARIABLES_BINNING['pt']) - 1, array('d', VARIABLES_BINNING['pt']),
-                        len(VARIABLES_BINNING['eta']) - 1, array('d', VARIABLES_BINNING['eta'])),
-                        "selectedBJets_nominal_{}_flavor_{}_pt".format(WP, flavor_type),
-                        "selectedBJets_nominal_{}_flavor_{}_eta".format(WP, flavor_type)
-                    )
-                    histo_output.Write()
-                    print("Tot 2D (b-tagging WP {}): {}".format(WP, histo_output.Integral()))
-
-                for var in VARIABLES_BINNING.keys():
-                    histo_output = root_df_filtered.Histo1D(
-                        ("{}_ak4_flavor_{}_{}_{}_{}".format(self.process_name, flavor_type, var, EVENT_SELECTION, lepton_selection), '', 
-                         len(VARIABLES_BINNING[var]) - 1, array('d', VARIABLES_BINNING[var])),
-                        "selectedJets_nominal_flavor_{}_{}".format(flavor_type, var),
-                    )
-                    histo_output.Write()
-                    for WP in B_TAGGING_WP[str(self.year)].keys():
-                        histo_output = root_df_filtered.Histo1D(
-                            ("{}_ak4_btagged_WP_{}_flavor_{}_{}_{}_{}".format(self.process_name, WP, flavor_type, var, EVENT_SELECTION, lepton_selection), '', 
-                             len(VARIABLES_BINNING[var]) - 1, array('d', VARIABLES_BINNING[var])),
-                            "selectedBJets_nominal_{}_flavor_{}_{}".format(WP, flavor_type, var),
-                        )
-                        histo_output.Write()
+                if 'etaVSpt' in histo_output.GetName():
+                    print("Tot 2D ({}): {}".format(histo_output.GetName(), histo_output.Integral()))
+        self.output_file.Close()
+
+    def _writing_efficiency_cube(self, booked_histos):
+        for variation in self.variations:
+            # the cubes of the lepton selections fill different bins of the same axis
+            cubes = [resulting_value(booked_histos[self._naming_output_dir(variation, lepton_selection)][0])
+                     for lepton_selection in LEPTON_SELECTION]
+            cube = cubes[0].Clone(cubes[0].GetName())
+            for other_cube in cubes[1:]:
+                cube.Add(other_cube)
+            print("Efficiency cube {} ({}): {} entries".format(cube.GetName(), variation, cube.GetEntries()))
+
+            if variation == NOMINAL_VARIATION: self.output_file.cd()
+            else: self.output_file.cd(variation)
+            cube.Write()
+        self.output_file.Close()
 
     def _adding_new_columns(self, root_df):
         #### new columns definitions
-        for flavor_type, flavor in zip(['b', 'c', 'udsg'], [5, 4, 0]):
-            root_df = root_df.Define(
-                    "jets_flavor_{}".format(flavor_type),
-                    "selectedJets_nominal_hadronFlavour == {}".format(flavor)
-                )
-            for var in VARIABLES_BINNING.keys():
+        # each jet collection is split by flavour in one pass (btagging_helpers.h),
+        # the per-flavour pt/eta columns are views on the split collections, defined with compiled callables
+        for variation in self.variations:
+            jet_collections = ['selectedJets_{}'.format(variation)]
+            # --- b-tagged jets
+            jet_collections += ['selectedBJets_{}_{}'.format(variation, WP) for WP in B_TAGGING_WP[str(self.year)].keys()]
+
+            for jet_collection in jet_collections:
                 root_df = root_df.Define(
-                    "selectedJets_nominal_flavor_{}_{}".format(flavor_type, var),
-                    "selectedJets_nominal_{}[jets_flavor_{}]".format(var, flavor_type)
+                    "{}_flavor_split".format(jet_collection),
+                    "btagging::SplitByFlavour({0}_pt, {0}_eta, {0}_hadronFlavour)".format(jet_collection)
+                )
+                root_df = ROOT.btagging.DefineFlavourViews(
+                    ROOT.RDF.AsRNode(root_df), jet_collection,
+                    ROOT.std.vector('string')(list(JET_FLAVORS.keys())),
+                    ROOT.std.vector('string')(list(self.variables_binning.keys()))
                 )
-                # print("selectedJets_nominal_flavor_{}_{}".format(flavor_type, var))
 
-            # --- b-tagged jets
-            for WP in B_TAGGING_WP[str(self.year)].keys():
+            if self.output_format == 'cube':
+                # all jets and b-tagged jets of each WP, in the order of the cube WP axis
                 root_df = root_df.Define(
-                    "bjets_wp_{}_flavor_{}".format(WP, flavor_type),
-                    "selectedBJets_nominal_{}_hadronFlavour == {}".format(WP, flavor)
+                    "efficiency_cube_entries_{}".format(variation),
+                    "btagging::MakeCubeEntries({})".format(', '.join(
+                        "{}_flavor_split".format(jet_collection) for jet_collection in jet_collections))
                 )
-                for var in VARIABLES_BINNING.keys():
-                    root_df = root_df.Define(
-                        "selectedBJets_nominal_{}_flavor_{}_{}".format(WP, flavor_type, var),
-                        "selectedBJets_nominal_{}_{}[bjets_wp_{}_flavor_{}]".format(WP, var, WP, flavor_type)
-                    )
-            # ---
         ####
         return root_df
 
@@ -246,7 +589,20 @@ class Processor:
 
         return root_df_filtered
 
-def main(input_file, output_dir, year):
+def main(input_file, output_dir, year, files_per_group, output_format, weighted, variations, fine_binning, incremental,
+         n_threads, deterministic, tasks_per_worker, cache_dir, checkpoint_entries):
+    setting_up_root()
+    configuring_threads(n_threads, deterministic, tasks_per_worker)
+
+    # several eras share the same ROOT session (C++ helpers declared once, same thread pool)
+    for era in year:
+        print("\n===== Year: {}".format(era))
+        processing_year(formatting_year_inputs(input_file, era, len(year)), output_dir, era, files_per_group, output_format, weighted, variations, fine_binning,
+                        incremental, cache_dir, checkpoint_entries)
+
+
+def processing_year(input_file, output_dir, year, files_per_group, output_format, weighted, variations, fine_binning, incremental,
+                    cache_dir=None, checkpoint_entries=0):
     # testing
     # input_file = "/nfs/dust/cms/user/gmilella/ttX_ntuplizer/sgn_2018_hotvr/merged/ttX_mass1250_width4_ntuplizer_output.root"
     # input_file = "/nfs/dust/cms/user/gmilella/ttX_ntuplizer/sgn_2018_central_hotvr/merged/TTZprimeToTT_M-750_Width4_output.root"
@@ -254,59 +610,307 @@ def main(input_file, output_dir, year):
     # input_file = "/nfs/dust/cms/user/gmilella/ttX_ntuplizer/data_2018_hotvr/merged/DoubleMuon_2018_B_output.root"
     # output_dir = ROOT_DIR
 
-    processor = Processor(input_file, output_dir, year)
-    processor.process()
+    input_files = expanding_input_files(input_file)
+    for process_name, file_group in grouping_files_by_process(input_files, files_per_group):
+        print("\n{}: {} file(s)".format(process_name, len(file_group)))
+        processor = Processor(file_group, output_dir, year, output_format=output_format, weighted=weighted, variations=variations,
+                              fine_binning=fine_binning, incremental=incremental, cache_dir=cache_dir,
+                              checkpoint_entries=checkpoint_entries)
+        processor.process()
+
+
+def setting_up_root():
+    # ROOT is imported and the C++ helpers loaded only once the processing starts:
+    # --help, argument errors and the scripts importing this module do not pay for it
+    global ROOT
+    if ROOT is not None: return
+    STARTUP['imports'] = IMPORTS_TIME
+    setup_start = time.time()
+
+    import ROOT
+    if not os.path.isfile(cpp_functions_header):
+        print('No cpp header found!')
+        sys.exit(1)
+    # shared libraries built once per version of the headers (btagging_build.py),
+    # declared to the interpreter if they cannot be built
+    for header in [cpp_functions_header, btagging_helpers_header]:
+        if not loading_compiled_header(header):
+            print("Compilation of {} failed: declared to the interpreter".format(header))
+            ROOT.gInterpreter.Declare('#include "{}"'.format(header))
+
+    STARTUP['root_setup'] = time.time() - setup_start
+    print("Startup: {:.2f} s (imports {:.2f} s, ROOT and C++ helpers {:.2f} s)".format(
+        STARTUP['imports'] + STARTUP['root_setup'], STARTUP['imports'], STARTUP['root_setup']))
+
+
+def parsing_jit_time(messages):
+    # "Just-in-time compilation phase completed in 1.234 seconds." (or "(no new code needed).") of the RDataFrame log
+    jit_time = 0.
+    for message in messages:
+        match = re.search(r'Just-in-time compilation phase completed in ([0-9.eE+-]+) seconds', message)
+        if match: jit_time += float(match.group(1))
+    return jit_time
+
+
+def jet_weight_column(jets, weighted):
+    # weight column of the histograms of a per-flavour jet collection ([] if unweighted)
+    return ["{}_weight".format(jets)] if weighted else []
+
+
+def resulting_value(result):
+    # booked result of the event loop or histogram already filled (processing in blocks)
+    return result.GetValue() if hasattr(result, 'GetValue') else result
+
+
+def adding_results(histos, booked_histos):
+    # sum of the histograms of the processed blocks, detached from the event loops and files
+    if histos is None:
+        histos = OrderedDict()
+        for output_dir_name, results in booked_histos.items():
+            histos[output_dir_name] = []
+            for result in results:
+                histo = resulting_value(result).Clone()
+                if hasattr(histo, 'SetDirectory'): histo.SetDirectory(0)
+                histos[output_dir_name].append(histo)
+        return histos
+
+    for output_dir_name, results in booked_histos.items():
+        for histo, result in zip(histos[output_dir_name], results):
+            histo.Add(resulting_value(result))
+    return histos
+
+
+def naming_checkpoint(output_path):
+    # not ending in .root: never taken as an analyzer output by the directory/glob inputs of the map-maker
+    return output_path + '.ckpt'
+
+
+def writing_checkpoint(checkpoint_path, histos, processed_entries, checkpoint_key):
+    # the histograms (flat keys) and the number of processed entries are written together,
+    # in a temporary file renamed once complete: a job evicted while writing keeps the previous checkpoint
+    tmp_path = "{}.{}.tmp".format(checkpoint_path, os.getpid())
+    checkpoint_file = ROOT.TFile(tmp_path, 'RECREATE')
+    layout = []
+    for i_dir, (output_dir_name, dir_histos) in enumerate(histos.items()):
+        layout.append([output_dir_name, []])
+        for i_histo, histo in enumerate(dir_histos):
+            key_name = "histo_{}_{}".format(i_dir, i_histo)
+            checkpoint_file.cd()
+            histo.Write(key_name)
+            layout[-1][1].append(key_name)
+    checkpoint_info = {'key': checkpoint_key, 'processed_entries': processed_entries, 'layout': layout}
+    checkpoint_file.cd()
+    ROOT.TNamed("checkpoint_info", json.dumps(checkpoint_info)).Write()
+    checkpoint_file.Close()
+    os.rename(tmp_path, checkpoint_path)
+
+
+def reading_checkpoint(checkpoint_path, checkpoint_key):
+    # (histograms, number of processed entries) of the checkpoint, (None, 0) if missing or of other inputs/configuration
+    if not os.path.exists(checkpoint_path): return None, 0
+    checkpoint_file = ROOT.TFile.Open(checkpoint_path, 'READ')
+    checkpoint_info = checkpoint_file.Get("checkpoint_info") if checkpoint_file and not checkpoint_file.IsZombie() else None
+    if not checkpoint_info:
+        print("Checkpoint {} not readable: ignored".format(checkpoint_path))
+        return None, 0
+    checkpoint_info = json.loads(checkpoint_info.GetTitle())
+    if checkpoint_info['key'] != checkpoint_key:
+        print("Checkpoint {} of other inputs or configuration: ignored".format(checkpoint_path))
+        checkpoint_file.Close()
+        return None, 0
+
+    histos = OrderedDict()
+    for output_dir_name, key_names in checkpoint_info['layout']:
+        histos[output_dir_name] = []
+        for key_name in key_names:
+            histo = checkpoint_file.Get(key_name)
+            if hasattr(histo, 'SetDirectory'): histo.SetDirectory(0)
+            histos[output_dir_name].append(histo)
+    checkpoint_file.Close()
+    return histos, checkpoint_info['processed_entries']
+
+
+def weight_columns():
+    # trigger and lepton weights of WEIGHTS_DICT
+    return sorted(set(column for weights in WEIGHTS_DICT.values()
+                      for column in re.findall(r'[A-Za-z_]\w*', weights)) - set(['event_weight']))
+
+
+def configuring_threads(n_threads=0, deterministic=False, tasks_per_worker=0):
+    # n_threads = 0: the cpus given to the job (see btagging_threads.py), not all the cores of the node
+    # deterministic: sequential event loop, the entries are always processed in the same order
+    if deterministic:
+        n_threads, source = 1, 'deterministic mode'
+    elif n_threads > 0:
+        source = '--n_threads'
+    else:
+        n_threads, source = detecting_n_threads()
+
+    if n_threads > 1:
+        ROOT.ROOT.EnableImplicitMT(n_threads)
+        # tasks (clusters ranges) per thread of the event loop: more tasks balance better, fewer have less overhead
+        if tasks_per_worker > 0:
+            ROOT.ROOT.TTreeProcessorMT.SetTasksPerWorkerHint(tasks_per_worker)
+    print("Event loop threads: {} ({})".format(n_threads, source))
+    return n_threads
+
+
+def analyzer_config(year, output_format='histos', weighted=False, variations=None, fine_binning=False, normalization=None):
+    # everything defining the content of an output, hashed in its manifest
+    config = OrderedDict([
+        ('year', str(year)),
+        ('event_selection', EVENT_SELECTION),
+        ('lepton_selection', LEPTON_SELECTION),
+        ('jet_flavors', list(JET_FLAVORS.items())),
+        ('b_tagging_wp', sorted(B_TAGGING_WP[str(year)].items())),
+        ('variables_binning', list((FINE_VARIABLES_BINNING if fine_binning else VARIABLES_BINNING).items())),
+        ('output_format', output_format),
+        ('variations', sorted(set([NOMINAL_VARIATION] + list(variations or [])))),
+        ('weighted', weighted),
+    ])
+    if weighted:
+        config['weights'] = sorted(WEIGHTS_DICT.items())
+        config['luminosity'] = LUMINOSITY[str(year)]
+        config['normalization'] = normalization
+    return config
+
+
+def naming_output_file(input_files, process_name, output_dir, year):
+    # bkg samples are divided in chunks
+    # so the output files should reflect this division
+    if len(input_files) == 1:
+        match = re.search(r'([^/]+)\.root$', str(input_files[0]))
+        if match: 
+            process_filename = match.group(1)
+        else:
+            print("File name not extracted properly...")
+            sys.exit(1)
+    else:
+        # several chunks processed together: the name is made unique
+        # (and reproducible) by hashing the chunk file names
+        chunks_hash = hashlib.sha1(
+            ' '.join(sorted(os.path.basename(str(f)) for f in input_files)).encode()).hexdigest()
+        process_filename = "{}_{}chunks_{}".format(process_name, len(input_files), chunks_hash[:8])
+
+    output_dir_path = os.path.join(output_dir, str(year), EVENT_SELECTION)
+    return os.path.join(output_dir_path, "{}_BTaggingEfficiencyMapAnalyzer_output_{}.root".format(process_filename, EVENT_SELECTION))
+
+
+def formatting_year_inputs(inputs, year, n_years=1):
+    # '{year}' in the input paths is replaced by the era (mandatory when several eras are processed)
+    if n_years > 1 and not any('{year}' in inp for inp in inputs):
+        print("Several years given: use the '{year}' placeholder in the input paths")
+        sys.exit(1)
+    return [inp.replace('{year}', year) for inp in inputs]
+
+
+def expanding_input_files(inputs):
+    # inputs can be root files, glob patterns, directories (e.g. the whole merged/ dir)
+    # or text files listing one input per line
+    input_files = []
+    for inp in inputs:
+        for item in inp.split(','):
+            item = item.strip()
+            if not item: continue
+            if os.path.isdir(item):
+                input_files.extend(sorted(glob.glob(os.path.join(item, '*.root'))))
+            elif item.endswith('.txt') and os.path.isfile(item):
+                with open(item) as list_file:
+                    input_files.extend(expanding_input_files(list_file.read().split()))
+            elif glob.has_magic(item):
+                input_files.extend(sorted(glob.glob(item)))
+            else:
+                input_files.append(item)
+    if not input_files:
+        print("No input files found in {}".format(inputs))
+        sys.exit(1)
+    return input_files
+
 
+def grouping_files_by_process(input_files, files_per_group=0):
+    # chunks of the same process are grouped together (files_per_group = 0: all of them)
+    files_by_process = OrderedDict()
+    for input_file in input_files:
+        files_by_process.setdefault(parsing_file(input_file), []).append(input_file)
 
-def parsing_file(file):
-    global PROCESS_NAME
+    groups = []
+    for process_name, files in files_by_process.items():
+        step = files_per_group if files_per_group > 0 else len(files)
+        for i in range(0, len(files), step):
+            groups.append((process_name, files[i:i + step]))
+    return groups
 
-    print("Processing file: {}".format(file))
 
+def parsing_file(file):
     # Convert file Path to string if it's a Path object
-    file_str = file
-
-    pattern = re.compile(r"merged\/(.*?)_MC")
-    # Search for the pattern in case of background samples
-    match = pattern.search(file_str)  # Use the string representation of the file path
-    # Search for the pattern in case of background samples
-    match = pattern.search(file_str)
-    if match:
-        print("Process name: {}".format(match.group(1)))
-        PROCESS_NAME = match.group(1)
-    else:
-        # Search for the pattern in case of signal samples
-        pattern = re.compile(r"merged\/(.*?)_ntuplizer")
-        match = pattern.search(file_str)
+    file_str = str(file)
+
+    # Search for the pattern in case of background samples,
+    # then for the ones of signal samples
+    for pattern in [r"merged\/(.*?)_MC", r"merged\/(.*?)_ntuplizer", r"merged\/(.*?)_output"]:
+        match = re.search(pattern, file_str)
         if match:
-            print("Process name: {}".format(match.group(1)))
-            PROCESS_NAME = match.group(1)
-        else:
-            print("No process name found.")
-            sys.exit()
+            return match.group(1)
 
-    return PROCESS_NAME
+    print("No process name found for file: {}".format(file_str))
+    sys.exit(1)
 
 #################################################
 
 def parse_args(argv=None):
     parser = ArgumentParser()
 
-    parser.add_argument('--input_file', type=str, required=True,
-        help="Input directory, where to find the h5 files")
+    parser.add_argument('--input_file', type=str, nargs='+', required=True,
+        help="Input root file(s). Glob patterns, directories (e.g. merged/) "
+             "and .txt files listing the inputs are accepted as well.")
     parser.add_argument('--output_dir', type=str,
         help="Top-level output directory. "
              "Will be created if not existing. "
              "If not provided, takes the input dir.")
-    parser.add_argument('--year', type=int, required=True,
-        help='Year of the samples.')
+    parser.add_argument('--year', type=str, nargs='+', required=True, choices=list(B_TAGGING_WP.keys()),
+        help="Year(s)/era(s) of the samples. With several eras, all of them are processed in the same job "
+             "and the '{year}' placeholder in the input paths is replaced by each era.")
+    parser.add_argument('--files_per_group', type=int, default=0,
+        help="Number of chunks of the same process chained in one job output. "
+             "If 0 (default), all the chunks of a process are processed together.")
+    parser.add_argument('--output_format', type=str, choices=OUTPUT_FORMATS, default='histos',
+        help="'histos': separate TH1/TH2 histograms (default), "
+             "'cube': one pt x eta x flavor x WP x lepton selection THnD per process.")
+    parser.add_argument('--weighted', action='store_true',
+        help="Fill the histograms with the event weights (xsec/lumi normalization, "
+             "trigger and lepton weights of each lepton selection), with sum of squared weights.")
+    parser.add_argument('--variations', type=str, nargs='*', default=[],
+        help="Jet collection variations (e.g. jesUp jerDown) booked together with the nominal one "
+             "in the same event loop. Stored in the {variation}/{lepton selection} directories.")
+    parser.add_argument('--fine_binning', action='store_true',
+        help="Use the fine pt/eta binning, to be merged according to the statistics "
+             "by makeBTaggingEfficiencyMap.py --min_effective_entries.")
+    parser.add_argument('--incremental', action='store_true',
+        help="Skip the inputs whose output is up to date: same inputs (size and modification time) "
+             "and same configuration as recorded in the output manifest ({output}.manifest.json).")
+
+    parser.add_argument('--n_threads', type=int, default=0,
+        help="Number of threads of the event loop (implicit MT), 1 runs the event loop sequentially. "
+             "If 0 (default), BTAGGING_N_THREADS or the cpus of the job (condor RequestCpus, cgroup cpu quota, cpu affinity).")
+    parser.add_argument('--deterministic', action='store_true',
+        help="Single-threaded event loop, reproducible bit by bit (for validation).")
+    parser.add_argument('--tasks_per_worker', type=int, default=0,
+        help="Number of tasks (ranges of clusters) per thread of the event loop. If 0 (default), the ROOT default.")
+    parser.add_argument('--cache_dir', type=str, default=None,
+        help="Local cache of the inputs: the first run writes only the needed columns of the events passing "
+             "a lepton selection (LZ4), the next runs on the same inputs read them instead of the ntuples.")
+    parser.add_argument('--checkpoint_entries', type=int, default=0,
+        help="Process the entries in blocks of this size, checkpointing the histograms after each block "
+             "({{output}}.ckpt): a restarted job resumes after the last processed block. If 0 (default), one event loop. "
+             "Each block builds and compiles the graph again (seconds per block): blocks should take minutes, "
+             "and at least {} entries are used.".format(MIN_CHECKPOINT_ENTRIES))
 
     args = parser.parse_args(argv)
 
     # If output directory is not provided, assume we want the output to be
     # alongside the input directory.
     if args.output_dir is None:
-        args.output_dir = args.input_file
+        args.output_dir = args.input_file[0]
 
     # Return the options as a dictionary.
     return vars(args)
@@ -0,0 +1,240 @@
+import os, sys
+import re
+import json
+import time
+import subprocess
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+import numpy as np
+
+# benchmark of BTaggingEfficiencyMapAnalyzer.py and makeBTaggingEfficiencyMap.py on synthetic Friends trees:
+# datasets of several sizes are generated locally (with the branches read by the analyzer), both scripts are
+# timed for several numbers of threads and the output histograms are compared to the first configuration
+# (or to the outputs of a previous benchmark with --reference)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCHMARK_DIR)
+ANALYZER = os.path.join(PACKAGE_DIR, 'BTaggingEfficiencyMapAnalyzer.py')
+MAP_MAKER = os.path.join(PACKAGE_DIR, 'makeBTaggingEfficiencyMap.py')
+SYNTHETIC_NTUPLES_HEADER = os.path.join(BENCHMARK_DIR, 'synthetic_ntuples.h')
+
+# process name of the synthetic samples (parsed by the analyzer from merged/{process}_MC...)
+PROCESS_NAME = 'synthetic_tt_dilepton'
+XSEC = 88.29
+EVENT_SELECTION = 'after2OS'
+
+
+def preparing_root_dir(root_dir, year, n_events):
+    # metadata read by the analyzer: xsec.yaml, sum_gen_weights.yaml and the cpp header of the analysis (empty here)
+    if not os.path.exists(root_dir):
+        os.makedirs(root_dir)
+    with open(os.path.join(root_dir, 'xsec.yaml'), 'w') as xsec_file:
+        xsec_file.write('{}:\n  isUsed: True\n  xSec: {}\n'.format(PROCESS_NAME, XSEC))
+    with open(os.path.join(root_dir, 'sum_gen_weights_{}.yaml'.format(year)), 'w') as sum_gen_weights_file:
+        sum_gen_weights_file.write('{}: {}\n'.format(PROCESS_NAME, float(n_events)))
+    open(os.path.join(root_dir, 'cpp_functions_header.h'), 'a').close()
+
+
+def importing_analyzer(root_dir):
+    # the analyzer reads BTAGGING_ROOT_DIR at import (the cpp header is loaded when the processing starts)
+    os.environ['BTAGGING_ROOT_DIR'] = root_dir
+    sys.path.insert(0, PACKAGE_DIR)
+    import BTaggingEfficiencyMapAnalyzer
+    return BTaggingEfficiencyMapAnalyzer
+
+
+def generating_dataset(analyzer, dataset_dir, year, n_events, n_files, seed):
+    # n_files Friends trees of n_events / n_files events, generated once per size
+    import ROOT
+    if not hasattr(ROOT, 'btagging_benchmark'):
+        ROOT.gInterpreter.Declare('#include "{}"'.format(SYNTHETIC_NTUPLES_HEADER))
+
+    wps = list(analyzer.B_TAGGING_WP[year].keys())
+    collections = [('selectedJets_nominal', ['pt', 'eta', 'hadronFlavour'])]
+    collections += [('selectedBJets_nominal_{}'.format(wp), ['bPt[{0}]'.format(i_wp), 'bEta[{0}]'.format(i_wp), 'bHadronFlavour[{0}]'.format(i_wp)])
+                    for i_wp, wp in enumerate(wps)]
+    # trigger and lepton weights of the analyzer (WEIGHTS_DICT), around 1 and only depending on the entry
+    weight_columns = sorted(set(column for weights in analyzer.WEIGHTS_DICT.values()
+                                for column in re.findall(r'[A-Za-z_]\w*', weights)) - set(['event_weight']))
+
+    merged_dir = os.path.join(dataset_dir, 'merged')
+    if not os.path.exists(merged_dir):
+        os.makedirs(merged_dir)
+    input_files = []
+    for i_file in range(n_files):
+        input_file = os.path.join(merged_dir, '{}_MC{}_ntuplizer_{}_merged.root'.format(PROCESS_NAME, year, i_file))
+        input_files.append(input_file)
+        if os.path.exists(input_file): continue
+
+        file_events = n_events // n_files + (1 if i_file < n_events % n_files else 0)
+        df = ROOT.RDataFrame(file_events).Define(
+            'synthetic_event', 'btagging_benchmark::GenerateEvent(rdfentry_, {})'.format(seed * 1000 + i_file))
+        columns = []
+        for collection, members in collections:
+            for variable, member in zip(['pt', 'eta', 'hadronFlavour'], members):
+                columns.append('{}_{}'.format(collection, variable))
+                df = df.Define(columns[-1], 'synthetic_event.{}'.format(member))
+        for i_lep, lepton_selection in enumerate(analyzer.LEPTON_SELECTION):
+            columns.append('eventSelection_{}_cut'.format(lepton_selection))
+            df = df.Define(columns[-1], 'synthetic_event.channel == {}'.format(i_lep))
+        columns.append('genweight')
+        df = df.Define('genweight', 'synthetic_event.genweight')
+        for i_weight, weight_column in enumerate(['puWeight'] + weight_columns):
+            columns.append(weight_column)
+            df = df.Define(weight_column, 'float(0.9 + 0.2 * ((rdfentry_ * 2654435761ULL + {}) % 1000) / 1000.)'.format(i_weight))
+
+        print("Generating {} ({} events)".format(input_file, file_events))
+        df.Snapshot('Friends', input_file, columns)
+    return input_files
+
+
+def running(command, env, log_path):
+    start = time.time()
+    with open(log_path, 'w') as log_file:
+        return_code = subprocess.call(command, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    if return_code != 0:
+        print("Failed ({}): {}, see {}".format(return_code, ' '.join(command), log_path))
+        sys.exit(1)
+    return time.time() - start
+
+
+def reading_histos(root_path):
+    # {path in the file: (contents, errors)} of all the histograms (THnD cubes included)
+    import ROOT
+    histos = OrderedDict()
+    root_file = ROOT.TFile.Open(root_path, 'READ')
+
+    def walking(directory, path):
+        for key in directory.GetListOfKeys():
+            obj = key.ReadObj()
+            obj_path = '/'.join([path, key.GetName()]) if path else key.GetName()
+            if obj.InheritsFrom('TDirectory'):
+                walking(obj, obj_path)
+            elif obj.InheritsFrom('TH1'):
+                n_cells = obj.GetNcells()
+                histos[obj_path] = (np.array([obj.GetBinContent(i) for i in range(n_cells)]),
+                                    np.array([obj.GetBinError(i) for i in range(n_cells)]))
+            elif obj.InheritsFrom('THnBase'):
+                n_bins = obj.GetNbins()
+                histos[obj_path] = (np.array([obj.GetBinContent(i) for i in range(n_bins)]),
+                                    np.array([obj.GetBinError(i) for i in range(n_bins)]))
+    walking(root_file, '')
+    root_file.Close()
+    return histos
+
+
+def comparing_outputs(output_dir, reference_dir, rtol):
+    # all the root files of output_dir compared with the ones of reference_dir (same relative paths)
+    differences = []
+    for subdir, _, files in os.walk(reference_dir):
+        for file_name in sorted(files):
+            if not file_name.endswith('.root'): continue
+            reference_path = os.path.join(subdir, file_name)
+            output_path = os.path.join(output_dir, os.path.relpath(reference_path, reference_dir))
+            if not os.path.exists(output_path):
+                differences.append('{}: missing'.format(output_path))
+                continue
+            reference_histos, output_histos = reading_histos(reference_path), reading_histos(output_path)
+            for histo_path, (contents, errors) in reference_histos.items():
+                if histo_path not in output_histos:
+                    differences.append('{}:{}: missing'.format(output_path, histo_path))
+                elif not (np.allclose(output_histos[histo_path][0], contents, rtol=rtol, atol=0.)
+                          and np.allclose(output_histos[histo_path][1], errors, rtol=rtol, atol=0.)):
+                    differences.append('{}:{}: different'.format(output_path, histo_path))
+    return differences
+
+
+def main(work_dir, sizes, n_threads, n_files, files_per_group, year, weighted, seed, reference, rtol):
+    work_dir = os.path.abspath(work_dir)
+    results = []
+    analyzer = None
+    for n_events in sizes:
+        dataset_dir = os.path.join(work_dir, 'events_{}'.format(n_events))
+        preparing_root_dir(dataset_dir, year, n_events)
+        if analyzer is None: analyzer = importing_analyzer(dataset_dir)
+        generating_dataset(analyzer, dataset_dir, year, n_events, n_files, seed)
+
+        env = dict(os.environ)
+        env['BTAGGING_ROOT_DIR'] = dataset_dir
+        env['BTAGGING_SUM_GEN_WEIGHTS_FILE'] = os.path.join(dataset_dir, 'sum_gen_weights_{year}.yaml')
+        env['BTAGGING_METADATA_CACHE'] = os.path.join(work_dir, 'metadata_cache')
+
+        first_output_dir = None
+        for threads in n_threads:
+            output_dir = os.path.join(dataset_dir, 'output_{}threads'.format(threads))
+            command = [sys.executable, ANALYZER, '--input_file', os.path.join(dataset_dir, 'merged'), '--output_dir', output_dir,
+                       '--year', year, '--n_threads', str(threads), '--files_per_group', str(files_per_group)]
+            if weighted: command.append('--weighted')
+            analyzer_time = running(command, env, os.path.join(dataset_dir, 'analyzer_{}threads.log'.format(threads)))
+
+            maps_time = running(
+                [sys.executable, MAP_MAKER, '--input_file', os.path.join(output_dir, year, EVENT_SELECTION), '--year', year,
+                 '--output_dir', output_dir, '--n_workers', str(threads)],
+                env, os.path.join(dataset_dir, 'maps_{}threads.log'.format(threads)))
+
+            # stage timings of the analyzer jobs
+            event_loop_time, events = 0., 0
+            analyzer_output_dir = os.path.join(output_dir, year, EVENT_SELECTION)
+            for file_name in os.listdir(analyzer_output_dir):
+                if not file_name.endswith('.profile.json'): continue
+                with open(os.path.join(analyzer_output_dir, file_name)) as profile_file:
+                    profile = json.load(profile_file)
+                event_loop_time += profile['stages']['event_loop']['wall']
+                events += profile['events']
+
+            reference_dir = os.path.join(reference, 'events_{}'.format(n_events), 'output_{}threads'.format(threads)) if reference else first_output_dir
+            differences = comparing_outputs(output_dir, reference_dir, rtol) if reference_dir else []
+            if first_output_dir is None: first_output_dir = output_dir
+
+            result = OrderedDict([
+                ('events', n_events), ('threads', threads),
+                ('analyzer', analyzer_time), ('event_loop', event_loop_time),
+                ('events_per_second', events / event_loop_time if event_loop_time else 0.),
+                ('maps', maps_time), ('differences', differences),
+            ])
+            results.append(result)
+            print("{:>10} events {:>3} threads: analyzer {:7.1f} s (event loop {:6.1f} s, {:8.0f} events/s), maps {:6.1f} s, {}".format(
+                n_events, threads, analyzer_time, event_loop_time, result['events_per_second'], maps_time,
+                'outputs unchanged' if not differences else '{} DIFFERENCES'.format(len(differences))))
+            for difference in differences[:10]:
+                print("    {}".format(difference))
+
+    results_path = os.path.join(work_dir, 'benchmark_results.json')
+    with open(results_path, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+    print("Results stored in {}".format(results_path))
+    if any(result['differences'] for result in results):
+        sys.exit(1)
+
+
+def parse_args(argv=None):
+    parser = ArgumentParser(description='Benchmark of the analyzer and the map maker on synthetic ntuples')
+    parser.add_argument('--work_dir', type=str, default=os.path.join(os.getcwd(), 'btagging_benchmark'),
+        help='Directory of the synthetic datasets (generated once and reused) and of the outputs.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000],
+        help='Numbers of events of the datasets.')
+    parser.add_argument('--n_threads', type=int, nargs='+', default=[1, 4],
+        help='Numbers of threads of the analyzer (and of workers of the map maker).')
+    parser.add_argument('--n_files', type=int, default=4,
+        help='Number of files of each dataset.')
+    parser.add_argument('--files_per_group', type=int, default=2,
+        help='Files per analyzer output (several outputs exercise the merge of the map maker).')
+    parser.add_argument('--year', type=str, default='2018',
+        help='Year of the b-tagging WPs.')
+    parser.add_argument('--weighted', action='store_true',
+        help='Run the analyzer with --weighted.')
+    parser.add_argument('--seed', type=int, default=1,
+        help='Seed of the synthetic datasets.')
+    parser.add_argument('--reference', type=str, default=None,
+        help='Work dir of a previous benchmark (same sizes and threads): the outputs are compared with its outputs. '
+             'By default they are compared with the outputs of the first number of threads.')
+    parser.add_argument('--rtol', type=float, default=1e-9,
+        help='Relative tolerance of the comparison (sums of weights depend on the order of the fills with several threads).')
+    args = parser.parse_args(argv)
+    return vars(args)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(**args)
@@ -0,0 +1,64 @@
+#ifndef BTAGGING_SYNTHETIC_NTUPLES_H
+#define BTAGGING_SYNTHETIC_NTUPLES_H
+
+#include "ROOT/RVec.hxx"
+#include "TRandom3.h"
+
+#include <array>
+#include <cmath>
+
+namespace btagging_benchmark {
+
+// b-tagging efficiencies of the loose, medium and tight WPs (nested) for b, c and udsg jets
+constexpr std::array<std::array<double, 3>, 3> kTagEfficiencies = {{{0.93, 0.78, 0.58}, {0.45, 0.16, 0.03}, {0.12, 0.015, 0.002}}};
+constexpr std::array<int, 3> kFlavours = {5, 4, 0};
+
+// jets of one synthetic event: all the selected jets and the b-tagged ones of each WP
+struct SyntheticEvent {
+    ROOT::RVecF pt;
+    ROOT::RVecF eta;
+    ROOT::RVecI hadronFlavour;
+    std::array<ROOT::RVecF, 3> bPt;
+    std::array<ROOT::RVecF, 3> bEta;
+    std::array<ROOT::RVecI, 3> bHadronFlavour;
+    int channel; // 0: ee, 1: emu, 2: mumu, -1: no dilepton selection
+    float genweight;
+};
+
+// the random numbers only depend on the entry: same events whatever the number of threads
+inline SyntheticEvent GenerateEvent(ULong64_t entry, unsigned int seed)
+{
+    TRandom3 random(seed * 1000003ULL + entry + 1);
+    SyntheticEvent event;
+
+    // ttbar dilepton-like: 2 b jets most of the times and extra radiation jets
+    const double channel = random.Uniform();
+    event.channel = channel < 0.25 ? 0 : channel < 0.70 ? 1 : channel < 0.95 ? 2 : -1;
+    event.genweight = random.Uniform() < 0.02 ? -1.f : 1.f;
+
+    const int nJets = 2 + random.Poisson(2.5);
+    for (int i = 0; i < nJets; ++i) {
+        const double flavourDraw = random.Uniform();
+        const int f = (i < 2 && flavourDraw < 0.85) ? 0 : flavourDraw < 0.12 ? 1 : 2;
+        const float pt = 20. + random.Exp(i < 2 ? 60. : 35.);
+        // the maps are binned in |eta|
+        const float eta = std::abs(random.Uniform(-2.4, 2.4));
+
+        event.pt.push_back(pt);
+        event.eta.push_back(eta);
+        event.hadronFlavour.push_back(kFlavours[f]);
+
+        const double tagDraw = random.Uniform();
+        for (std::size_t wp = 0; wp < 3; ++wp) {
+            if (tagDraw >= kTagEfficiencies[f][wp]) break;
+            event.bPt[wp].push_back(pt);
+            event.bEta[wp].push_back(eta);
+            event.bHadronFlavour[wp].push_back(kFlavours[f]);
+        }
+    }
+    return event;
+}
+
+} // namespace btagging_benchmark
+
+#endif
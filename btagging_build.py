@@ -0,0 +1,60 @@
+import os
+import re
+import fcntl
+import shutil
+import hashlib
+
+# the C++ helpers of the analyzer (btagging_helpers.h, cpp_functions_header.h) are compiled once with ACLiC
+# into shared libraries cached in BTAGGING_BUILD_DIR (default ~/.cache/btagging), in one directory per ROOT build
+# (version, architecture, compiler) and named after the hash of the header: the next jobs only load the library
+# instead of parsing and compiling the header again, and a modified header or another ROOT gets a new library
+BUILD_DIR_ENV = 'BTAGGING_BUILD_DIR'
+
+
+def default_build_dir():
+    return os.environ.get(BUILD_DIR_ENV) or os.path.join(os.path.expanduser('~'), '.cache', 'btagging')
+
+
+def naming_root_build(ROOT):
+    # e.g. root-6.20.07_linuxx8664gcc_8.4.0: libraries of a ROOT build are never loaded by another one
+    root_build = 'root-{}_{}_{}'.format(ROOT.gROOT.GetVersion(), ROOT.gSystem.GetBuildArch(), ROOT.gSystem.GetBuildCompilerVersion())
+    return re.sub(r'[^\w.-]', '.', root_build)
+
+
+def hashing_header(header_path):
+    with open(header_path, 'rb') as header_file:
+        return hashlib.sha1(header_file.read()).hexdigest()
+
+
+def naming_compiled_source(header_path, build_dir):
+    # copy of the header in the build dir, ACLiC writes its library next to it ({name}_{hash}_h.so)
+    header_name = os.path.splitext(os.path.basename(header_path))[0]
+    return os.path.join(build_dir, '{}_{}.h'.format(header_name, hashing_header(header_path)[:12]))
+
+
+def loading_compiled_header(header_path, build_dir=None):
+    # True if the compiled library is loaded, False if it could not be built (the header is then to be declared)
+    import ROOT
+
+    build_dir = os.path.join(build_dir or default_build_dir(), naming_root_build(ROOT))
+    if not os.path.isdir(build_dir):
+        try:
+            os.makedirs(build_dir)
+        except OSError:
+            if not os.path.isdir(build_dir): return False
+    source_path = naming_compiled_source(header_path, build_dir)
+
+    # headers included relatively to the original one
+    ROOT.gSystem.AddIncludePath('-I"{}"'.format(os.path.dirname(os.path.abspath(header_path))))
+    try:
+        with open(source_path + '.lock', 'w') as lock_file:
+            # one job compiles, the concurrent ones wait and load its library
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not os.path.exists(source_path):
+                shutil.copyfile(header_path, source_path)
+            # 'k': keep the library, 'O': optimized; rebuilt only if older than the source
+            return bool(ROOT.gSystem.CompileMacro(source_path, 'kO', '', build_dir))
+    except (IOError, OSError) as error:
+        # e.g. read-only build dir on a worker node
+        print("Build dir {} not usable ({})".format(build_dir, error))
+        return False
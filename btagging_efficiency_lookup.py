@@ -0,0 +1,81 @@
+from collections import OrderedDict
+from argparse import ArgumentParser
+
+import numpy as np
+
+# flavor names of the efficiency maps and the corresponding jet hadronFlavour
+HADRON_FLAVORS = OrderedDict([('b', 5), ('c', 4), ('udsg', 0)])
+
+# values stored for each map of the export (makeBTaggingEfficiencyMap.py --export npz)
+MAP_VALUES = ['efficiency', 'error', 'down', 'up']
+
+
+class EfficiencyLookup:
+    # b-tagging efficiencies of the maps exported by makeBTaggingEfficiencyMap.py --export npz,
+    # evaluated for whole arrays of jets at once (no ROOT needed):
+    #   lookup = EfficiencyLookup('efficiencyMaps_2018.npz')
+    #   efficiency = lookup.evaluate('TTTo2L2Nu', 'medium', jet_pt, jet_eta, jet_hadronFlavour)
+    # the maps are stored as '{process}/{lepton selection}/{flavor}/{WP}/{values}' arrays (values: pt_edges,
+    # eta_edges and the efficiency, error, down, up of shape (eta bins, pt bins))
+    def __init__(self, path):
+        self.path = path
+        self.maps = {}
+        with np.load(path) as export_file:
+            for name in export_file.files:
+                self.maps[name] = export_file[name]
+
+        self.keys = sorted(set(tuple(name.split('/')[:4]) for name in self.maps.keys()))
+
+    def processes(self):
+        return sorted(set(key[0] for key in self.keys))
+
+    def evaluate(self, process, wp_btagging, pt, eta, hadron_flavor, lepton_selection='all', values='efficiency'):
+        # pt, eta, hadron_flavor: arrays of the same shape (any shape, e.g. the flattened jets of many events)
+        # jets outside the binning take the value of the closest bin; jets with another hadronFlavour get 0
+        # unknown values or missing maps raise ValueError / KeyError (the caller's job is not exited)
+        pt, eta = np.asarray(pt, dtype=np.float64), np.asarray(eta, dtype=np.float64)
+        hadron_flavor = np.asarray(hadron_flavor)
+        if values not in MAP_VALUES:
+            raise ValueError("Unknown values {}: choose among {}".format(values, MAP_VALUES))
+
+        result = np.zeros(pt.shape, dtype=np.float64)
+        for flavor, flavor_id in HADRON_FLAVORS.items():
+            prefix = '/'.join([process, lepton_selection, flavor, wp_btagging])
+            if prefix + '/' + values not in self.maps:
+                raise KeyError("No efficiency map {} in {}".format(prefix, self.path))
+
+            mask = hadron_flavor == flavor_id
+            if not mask.any(): continue
+            pt_edges, eta_edges = self.maps[prefix + '/pt_edges'], self.maps[prefix + '/eta_edges']
+            # maps binned in |eta| when the eta edges start at 0
+            jets_eta = np.abs(eta[mask]) if eta_edges[0] >= 0 else eta[mask]
+            i_pt = finding_bins(pt_edges, pt[mask])
+            i_eta = finding_bins(eta_edges, jets_eta)
+            result[mask] = self.maps[prefix + '/' + values][i_eta, i_pt]
+        return result
+
+
+def finding_bins(edges, values):
+    # bin index of each value, clamped to the first and last bins
+    return np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+
+
+def parse_args(argv=None):
+    parser = ArgumentParser(description='Print the efficiency maps of an export of makeBTaggingEfficiencyMap.py')
+    parser.add_argument('--input_file', type=str, required=True,
+        help='.npz file written by makeBTaggingEfficiencyMap.py --export npz')
+    args = parser.parse_args(argv)
+    return vars(args)
+
+
+def main(input_file):
+    lookup = EfficiencyLookup(input_file)
+    for key in lookup.keys:
+        prefix = '/'.join(key)
+        print("{}: pt edges {}, eta edges {}".format(
+            prefix, lookup.maps[prefix + '/pt_edges'].tolist(), lookup.maps[prefix + '/eta_edges'].tolist()))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(**args)
@@ -0,0 +1,261 @@
+#ifndef BTAGGING_HELPERS_H
+#define BTAGGING_HELPERS_H
+
+#include "ROOT/RDataFrame.hxx"
+#include "ROOT/RVec.hxx"
+#include "RVersion.h"
+#include "THn.h"
+
+#if ROOT_VERSION_CODE >= ROOT_VERSION(6, 24, 0)
+#include "ROOT/RLogger.hxx"
+#endif
+
+#include <array>
+#include <cstddef>
+#include <memory>
+#include <mutex>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+namespace btagging {
+
+// hadron flavours of the jets, same order as JET_FLAVORS in BTaggingEfficiencyMapAnalyzer.py: b, c, udsg
+constexpr std::array<int, 3> kFlavours = {5, 4, 0};
+
+// pt and eta of a jet collection split by hadron flavour
+template <typename T>
+struct FlavourSplitJets {
+    std::array<ROOT::RVec<T>, 3> pt;
+    std::array<ROOT::RVec<T>, 3> eta;
+};
+
+// splits a jet collection by flavour in a single pass over the jets
+template <typename T, typename F>
+FlavourSplitJets<T> SplitByFlavour(const ROOT::RVec<T> &pt, const ROOT::RVec<T> &eta, const ROOT::RVec<F> &hadronFlavour)
+{
+    FlavourSplitJets<T> split;
+    for (std::size_t f = 0; f < kFlavours.size(); ++f) {
+        split.pt[f].reserve(pt.size());
+        split.eta[f].reserve(pt.size());
+    }
+
+    for (std::size_t i = 0; i < pt.size(); ++i) {
+        for (std::size_t f = 0; f < kFlavours.size(); ++f) {
+            if (hadronFlavour[i] == kFlavours[f]) {
+                split.pt[f].push_back(pt[i]);
+                split.eta[f].push_back(eta[i]);
+                break;
+            }
+        }
+    }
+    return split;
+}
+
+// non-owning view of one of the split collections: the split column is cached
+// by RDataFrame for the whole entry, so the histograms can be filled without copies
+template <typename T>
+ROOT::RVec<T> View(const ROOT::RVec<T> &values)
+{
+    return ROOT::RVec<T>(const_cast<T *>(values.data()), values.size());
+}
+
+// typed callable returning the view of one variable (pt or eta) of one flavour of a split collection
+template <typename T>
+struct FlavourView {
+    std::array<ROOT::RVec<T>, 3> FlavourSplitJets<T>::*variable;
+    std::size_t flavour;
+
+    ROOT::RVec<T> operator()(const FlavourSplitJets<T> &jets) const { return View((jets.*variable)[flavour]); }
+};
+
+template <typename T>
+ROOT::RDF::RNode DefineFlavourViews(ROOT::RDF::RNode df, const std::string &collection,
+                                    const std::vector<std::string> &flavours, const std::vector<std::string> &variables)
+{
+    for (const auto &var : variables) {
+        std::array<ROOT::RVec<T>, 3> FlavourSplitJets<T>::*variable = nullptr;
+        if (var == "pt")
+            variable = &FlavourSplitJets<T>::pt;
+        else if (var == "eta")
+            variable = &FlavourSplitJets<T>::eta;
+        else
+            throw std::invalid_argument("btagging::DefineFlavourViews: no split variable " + var);
+        for (std::size_t f = 0; f < flavours.size() && f < kFlavours.size(); ++f)
+            df = df.Define(collection + "_flavor_" + flavours[f] + "_" + var, FlavourView<T>{variable, f},
+                           {collection + "_flavor_split"});
+    }
+    return df;
+}
+
+// defines the {collection}_flavor_{flavour}_{variable} views of the {collection}_flavor_split column
+// with compiled callables: nothing is compiled just in time for them, whatever the number of columns
+inline ROOT::RDF::RNode DefineFlavourViews(ROOT::RDF::RNode df, const std::string &collection,
+                                           const std::vector<std::string> &flavours, const std::vector<std::string> &variables)
+{
+    // the split collections have the type of the jet pt (Float_t in NanoAOD)
+    const auto ptType = df.GetColumnType(collection + "_pt");
+    if (ptType.find("double") != std::string::npos || ptType.find("Double_t") != std::string::npos)
+        return DefineFlavourViews<double>(df, collection, flavours, variables);
+    return DefineFlavourViews<float>(df, collection, flavours, variables);
+}
+
+// per-jet weights: the event weight repeated for each jet of a collection (same length as the collection values)
+template <typename T>
+ROOT::RVec<double> JetWeights(const ROOT::RVec<T> &values, double weight)
+{
+    return ROOT::RVec<double>(values.size(), weight);
+}
+
+// --- efficiency cube: pt x eta x flavour x WP passed x lepton channel
+
+// jets entering the efficiency cube: all the jets (WP bin 0)
+// and the b-tagged ones (WP bin i for the i-th WP)
+struct CubeEntries {
+    ROOT::RVec<double> pt;
+    ROOT::RVec<double> eta;
+    ROOT::RVec<double> flavour;
+    ROOT::RVec<double> wp;
+};
+
+template <typename T>
+void AddCubeEntries(CubeEntries &entries, const FlavourSplitJets<T> &jets, int wp)
+{
+    for (std::size_t f = 0; f < kFlavours.size(); ++f) {
+        for (std::size_t i = 0; i < jets.pt[f].size(); ++i) {
+            entries.pt.push_back(jets.pt[f][i]);
+            entries.eta.push_back(jets.eta[f][i]);
+            entries.flavour.push_back(f);
+            entries.wp.push_back(wp);
+        }
+    }
+}
+
+// all jets first, then the b-tagged jets of each WP (in the order of the arguments)
+template <typename T, typename... BJets>
+CubeEntries MakeCubeEntries(const FlavourSplitJets<T> &jets, const BJets &...bjets)
+{
+    CubeEntries entries;
+    int wp = 0;
+    AddCubeEntries(entries, jets, wp);
+    int expander[] = {0, (AddCubeEntries(entries, bjets, ++wp), 0)...};
+    (void)expander;
+    return entries;
+}
+
+// RDataFrame action filling the efficiency cube of one lepton channel, one Fill per jet
+// (the cube model is created in BTaggingEfficiencyMapAnalyzer.py)
+class EfficiencyCubeHelper : public ROOT::Detail::RDF::RActionImpl<EfficiencyCubeHelper> {
+public:
+    using Result_t = THnD;
+
+    EfficiencyCubeHelper(const THnD &model, int channel, unsigned int nSlots) : fChannel(channel)
+    {
+        for (unsigned int slot = 0; slot < nSlots; ++slot)
+            fCubes.emplace_back(static_cast<THnD *>(model.Clone()));
+    }
+    EfficiencyCubeHelper(EfficiencyCubeHelper &&) = default;
+    EfficiencyCubeHelper(const EfficiencyCubeHelper &) = delete;
+
+    std::shared_ptr<THnD> GetResultPtr() const { return fCubes[0]; }
+    void Initialize() {}
+    void InitTask(TTreeReader *, unsigned int) {}
+
+    void Exec(unsigned int slot, const CubeEntries &entries) { Exec(slot, entries, 1.); }
+
+    // all the jets of the event are filled with the event weight
+    void Exec(unsigned int slot, const CubeEntries &entries, double weight)
+    {
+        double x[5] = {0., 0., 0., 0., fChannel + 0.5};
+        for (std::size_t i = 0; i < entries.pt.size(); ++i) {
+            x[0] = entries.pt[i];
+            x[1] = entries.eta[i];
+            x[2] = entries.flavour[i] + 0.5;
+            x[3] = entries.wp[i] + 0.5;
+            fCubes[slot]->Fill(x, weight);
+        }
+    }
+
+    void Finalize()
+    {
+        for (std::size_t slot = 1; slot < fCubes.size(); ++slot)
+            fCubes[0]->Add(fCubes[slot].get());
+    }
+
+    std::string GetActionName() const { return "EfficiencyCube"; }
+
+private:
+    std::vector<std::shared_ptr<THnD>> fCubes;
+    int fChannel;
+};
+
+// weightColumn (of type double) is optional: unweighted cube if empty
+inline ROOT::RDF::RResultPtr<THnD> BookEfficiencyCube(ROOT::RDF::RNode df, const THnD &model, int channel,
+                                                      const std::string &entriesColumn, const std::string &weightColumn = "")
+{
+    if (weightColumn.empty())
+        return df.Book<CubeEntries>(EfficiencyCubeHelper(model, channel, df.GetNSlots()), {entriesColumn});
+    return df.Book<CubeEntries, double>(EfficiencyCubeHelper(model, channel, df.GetNSlots()), {entriesColumn, weightColumn});
+}
+
+#if ROOT_VERSION_CODE >= ROOT_VERSION(6, 24, 0)
+// --- info messages of the RDataFrame log channel: just-in-time compilation and event loop times
+
+class RDFLogHandler : public ROOT::Experimental::RLogHandler {
+public:
+    RDFLogHandler(std::vector<std::string> &messages, std::mutex &mutex) : fMessages(messages), fMutex(mutex) {}
+
+    // the info messages of RDataFrame are kept (and not printed), the other ones go to the next handlers
+    bool Emit(const ROOT::Experimental::RLogEntry &entry) override
+    {
+        if (entry.fChannel != &ROOT::Detail::RDF::RDFLogChannel() || entry.fLevel != ROOT::Experimental::ELogLevel::kInfo)
+            return true;
+        std::lock_guard<std::mutex> lock(fMutex);
+        fMessages.push_back(entry.fMessage);
+        return false;
+    }
+
+private:
+    std::vector<std::string> &fMessages;
+    std::mutex &fMutex;
+};
+
+// records the RDataFrame info messages from its creation until Stop()
+class RDFLogRecorder {
+public:
+    RDFLogRecorder()
+        : fVerbosity(new ROOT::Experimental::RLogScopedVerbosity(ROOT::Detail::RDF::RDFLogChannel(),
+                                                                 ROOT::Experimental::ELogLevel::kInfo))
+    {
+        std::unique_ptr<RDFLogHandler> handler(new RDFLogHandler(fMessages, fMutex));
+        fHandler = handler.get();
+        ROOT::Experimental::RLogManager::Get().PushFront(std::move(handler));
+    }
+    ~RDFLogRecorder() { Stop(); }
+
+    void Stop()
+    {
+        if (!fHandler)
+            return;
+        ROOT::Experimental::RLogManager::Get().Remove(fHandler);
+        fHandler = nullptr;
+        fVerbosity.reset();
+    }
+
+    std::vector<std::string> Messages()
+    {
+        std::lock_guard<std::mutex> lock(fMutex);
+        return fMessages;
+    }
+
+private:
+    std::vector<std::string> fMessages;
+    std::mutex fMutex;
+    std::unique_ptr<ROOT::Experimental::RLogScopedVerbosity> fVerbosity;
+    RDFLogHandler *fHandler = nullptr;
+};
+#endif
+
+} // namespace btagging
+
+#endif
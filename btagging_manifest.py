@@ -0,0 +1,94 @@
+import os
+import glob
+import json
+import hashlib
+import tempfile
+from collections import OrderedDict
+
+from btagging_metadata import fingerprinting_file
+
+# each output file (analyzer outputs, merged inputs of the maps) has a manifest next to it:
+# {output}.manifest.json with the fingerprints (size, mtime) of the inputs and the hash
+# of the configuration which produced it, written once the output is complete
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+def naming_manifest(output_path):
+    return output_path + MANIFEST_SUFFIX
+
+
+def fingerprinting_inputs(input_files):
+    return OrderedDict((os.path.abspath(str(input_file)), list(fingerprinting_file(str(input_file))))
+                       for input_file in input_files)
+
+
+def hashing_config(config):
+    # config: json serializable (binning, WPs, selections, ...)
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def reading_manifest(output_path):
+    try:
+        with open(naming_manifest(output_path)) as manifest_file:
+            return json.load(manifest_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def is_up_to_date(output_path, input_files, config_hash):
+    # the output exists and was produced from the same inputs (unchanged) with the same configuration
+    manifest = reading_manifest(output_path)
+    if manifest is None or not os.path.isfile(output_path): return False
+    if manifest.get('config_hash') != config_hash: return False
+    try:
+        return manifest.get('inputs') == fingerprinting_inputs(input_files)
+    except OSError:
+        return False
+
+
+def removing_manifest(output_path):
+    # called before an output is (re)created: an interrupted job leaves no valid manifest behind
+    if os.path.exists(naming_manifest(output_path)):
+        os.remove(naming_manifest(output_path))
+
+
+def recording_output(output_path, input_files, config_hash, **info):
+    # written to a temporary file and renamed, so that the manifest is never read partially
+    manifest = OrderedDict([
+        ('output', os.path.abspath(output_path)),
+        ('config_hash', config_hash),
+        ('inputs', fingerprinting_inputs(input_files)),
+    ])
+    manifest.update(sorted(info.items()))
+
+    manifest_dir = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=manifest_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.rename(tmp_path, naming_manifest(output_path))
+
+
+def superseded_outputs(output_path, input_files, process):
+    # other outputs of the same directory and process sharing an input file with output_path (written by
+    # a previous grouping of the chunks): merged together with output_path, they would count these events twice
+    output_path = os.path.abspath(output_path)
+    input_paths = set(os.path.abspath(str(input_file)) for input_file in input_files)
+    outputs = []
+    for manifest_path in sorted(glob.glob(os.path.join(os.path.dirname(output_path), '*' + MANIFEST_SUFFIX))):
+        other_path = manifest_path[:-len(MANIFEST_SUFFIX)]
+        if other_path == output_path: continue
+        manifest = reading_manifest(other_path)
+        if not manifest or manifest.get('process') != process: continue
+        if input_paths & set(manifest.get('inputs', {}).keys()):
+            outputs.append(other_path)
+    return outputs
+
+
+def removing_output(output_path):
+    # the output first, then its manifest and the other json sidecars ({output}.profile.json)
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    output_dir, output_name = os.path.split(os.path.abspath(output_path))
+    for file_name in os.listdir(output_dir):
+        if file_name.startswith(output_name + '.') and file_name.endswith('.json'):
+            os.remove(os.path.join(output_dir, file_name))
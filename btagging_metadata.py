@@ -0,0 +1,70 @@
+import os
+import hashlib
+import pickle
+import tempfile
+
+import yaml
+# the C loader (libyaml) is much faster than the pure python one
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml.loader import SafeLoader
+
+# local cache of the parsed metadata files (xsec.yaml, sum_gen_weights.yaml, ...)
+CACHE_DIR = os.environ.get('BTAGGING_METADATA_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'bTaggingEfficiencyMap', 'metadata'))
+
+# parsed files of the current session: {path: (fingerprint, content)}
+_loaded_yaml = {}
+
+
+def fingerprinting_file(path):
+    # cheap fingerprint of a file: only stat, the file is not read
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime)
+
+
+def load_yaml(path, cache_dir=CACHE_DIR):
+    # parses a yaml file once per session, and once per file modification across sessions:
+    # the parsed content is pickled in cache_dir, keyed on the file path and validated on size and mtime
+    path = os.path.abspath(path)
+    fingerprint = fingerprinting_file(path)
+
+    if path in _loaded_yaml and _loaded_yaml[path][0] == fingerprint:
+        return _loaded_yaml[path][1]
+
+    cache_file = os.path.join(cache_dir, '{}.pkl'.format(hashlib.sha1(path.encode()).hexdigest()))
+    content = _reading_cache(cache_file, fingerprint)
+    if content is None:
+        with open(path) as yaml_file:
+            content = yaml.load(yaml_file, Loader=SafeLoader)
+        _writing_cache(cache_file, fingerprint, content)
+
+    _loaded_yaml[path] = (fingerprint, content)
+    return content
+
+
+def _reading_cache(cache_file, fingerprint):
+    try:
+        with open(cache_file, 'rb') as f:
+            cached_fingerprint, content = pickle.load(f)
+    except Exception:
+        return None
+    if tuple(cached_fingerprint) != fingerprint:
+        return None
+    return content
+
+
+def _writing_cache(cache_file, fingerprint, content):
+    # written to a temporary file and renamed, so that concurrent jobs never read a partial cache
+    # the cache is only an optimization: failures (e.g. read-only home) are ignored
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((fingerprint, content), f, protocol=2)
+        os.rename(tmp_path, cache_file)
+    except (IOError, OSError) as error:
+        print("Metadata cache not written ({})".format(error))
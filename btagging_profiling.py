@@ -0,0 +1,166 @@
+import os, sys
+import json
+import time
+import glob
+import tempfile
+from contextlib import contextmanager
+from collections import OrderedDict
+from argparse import ArgumentParser
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# each analyzer output has a profile next to it ({output}.profile.json): wall and cpu time of each stage
+# (metadata, output file, graph construction, just-in-time compilation, event loop, write),
+# events/s, event loops, bytes read and peak RSS
+PROFILE_SUFFIX = '.profile.json'
+
+
+class StageProfiler:
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.info = OrderedDict()
+
+    @contextmanager
+    def stage(self, name):
+        # the cpu time is the one of all the threads of the process
+        wall_start, cpu_start = time.time(), cpu_time()
+        try:
+            yield
+        finally:
+            stage = self.stages.setdefault(name, OrderedDict([('wall', 0.), ('cpu', 0.)]))
+            stage['wall'] += time.time() - wall_start
+            stage['cpu'] += cpu_time() - cpu_start
+
+    def split(self, name, part_name, wall):
+        # part of a stage measured separately (e.g. the just-in-time compilation at the start of the event loop),
+        # moved to its own stage; the cpu time of the part is taken as its wall time (single thread)
+        stage = self.stages[name]
+        wall = min(wall, stage['wall'])
+        part = self.stages.setdefault(part_name, OrderedDict([('wall', 0.), ('cpu', 0.)]))
+        part['wall'] += wall
+        part['cpu'] += min(wall, stage['cpu'])
+        stage['cpu'] -= min(wall, stage['cpu'])
+        stage['wall'] -= wall
+
+    def report(self):
+        report = OrderedDict(self.info)
+        report['stages'] = self.stages
+        report['wall'] = sum(stage['wall'] for stage in self.stages.values())
+        report['cpu'] = sum(stage['cpu'] for stage in self.stages.values())
+        if 'events' in report and 'event_loop' in self.stages and self.stages['event_loop']['wall'] > 0:
+            report['events_per_second'] = report['events'] / self.stages['event_loop']['wall']
+        report['peak_rss_mb'] = peak_rss_mb()
+        return report
+
+
+def cpu_time():
+    # user + system time of the process (os.times: also with the python 2 of the CMSSW releases)
+    times = os.times()
+    return times[0] + times[1]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kB on Linux
+    if resource is None: return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def naming_profile(output_path):
+    return output_path + PROFILE_SUFFIX
+
+
+def writing_profile(output_path, report):
+    profile_dir = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=profile_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as profile_file:
+        json.dump(report, profile_file, indent=2)
+    os.rename(tmp_path, naming_profile(output_path))
+
+
+def reading_profiles(inputs):
+    # inputs: profiles, directories or glob patterns
+    profile_paths = []
+    for inp in inputs:
+        if os.path.isdir(inp):
+            profile_paths.extend(sorted(glob.glob(os.path.join(inp, '*' + PROFILE_SUFFIX))))
+        elif glob.has_magic(inp):
+            profile_paths.extend(sorted(glob.glob(inp)))
+        else:
+            profile_paths.append(inp)
+
+    profiles = []
+    for profile_path in profile_paths:
+        with open(profile_path) as profile_file:
+            profile = json.load(profile_file)
+        profile['profile'] = profile_path
+        profiles.append(profile)
+    if not profiles:
+        print("No profiles found in {}".format(inputs))
+        sys.exit(1)
+    return profiles
+
+
+def summarizing_profiles(profiles, sort_by='wall', n_rows=20):
+    stage_names = []
+    for profile in profiles:
+        stage_names += [name for name in profile['stages'].keys() if name not in stage_names]
+
+    print("{} jobs, {:.0f} s wall, {:.0f} s cpu, {} events".format(
+        len(profiles), sum(profile['wall'] for profile in profiles),
+        sum(profile['cpu'] for profile in profiles), sum(profile.get('events', 0) for profile in profiles)))
+    print("\nTime per stage (wall / cpu, s):")
+    for name in stage_names:
+        print("  {:<14} {:>10.1f} {:>10.1f}".format(
+            name, sum(profile['stages'].get(name, {}).get('wall', 0.) for profile in profiles),
+            sum(profile['stages'].get(name, {}).get('cpu', 0.) for profile in profiles)))
+
+    # per process, the slowest ones first
+    processes = OrderedDict()
+    for profile in profiles:
+        process = processes.setdefault(profile.get('process', '?'), OrderedDict([('jobs', 0), ('wall', 0.), ('events', 0)]))
+        process['jobs'] += 1
+        process['wall'] += profile['wall']
+        process['events'] += profile.get('events', 0)
+    print("\n{:<40} {:>5} {:>10} {:>12} {:>10}".format('process', 'jobs', 'wall (s)', 'events', 'events/s'))
+    for process, summary in sorted(processes.items(), key=lambda item: -item[1]['wall'])[:n_rows]:
+        print("{:<40} {:>5} {:>10.1f} {:>12} {:>10.0f}".format(
+            process, summary['jobs'], summary['wall'], summary['events'], summary['events'] / summary['wall'] if summary['wall'] else 0.))
+
+    # lowest throughput first for events_per_second, highest values first otherwise
+    sign = 1 if sort_by == 'events_per_second' else -1
+    print("\nSlowest jobs (by {}):".format(sort_by))
+    print("{:>10} {:>10} {:>12} {:>10} {:>10}  {}".format('wall (s)', 'loop (s)', 'events/s', 'MB read', 'RSS (MB)', 'output'))
+    for profile in sorted(profiles, key=lambda profile: sign * (profile.get(sort_by) or 0))[:n_rows]:
+        print("{:>10.1f} {:>10.1f} {:>12.0f} {:>10.1f} {:>10.0f}  {}".format(
+            profile['wall'], profile['stages'].get('event_loop', {}).get('wall', 0.), profile.get('events_per_second', 0.),
+            profile.get('bytes_read', 0) / 1024. ** 2, profile.get('peak_rss_mb') or 0., profile.get('output', profile['profile'])))
+
+
+def parse_args(argv=None):
+    parser = ArgumentParser(description='Summary of the profiles of the analyzer jobs')
+    parser.add_argument('--input_file', type=str, nargs='+', required=True,
+        help='Profiles ({output}.profile.json), glob patterns or directories (e.g. OUTPUT_DIR/YEAR/after2OS/).')
+    parser.add_argument('--sort_by', type=str, default='wall', choices=['wall', 'cpu', 'events_per_second', 'bytes_read', 'peak_rss_mb'],
+        help='Ordering of the jobs in the summary.')
+    parser.add_argument('--n_rows', type=int, default=20,
+        help='Number of processes and jobs shown.')
+    parser.add_argument('--output', type=str, default=None,
+        help='Also store all the profiles in this JSON file.')
+    args = parser.parse_args(argv)
+    return vars(args)
+
+
+def main(input_file, sort_by, n_rows, output):
+    profiles = reading_profiles(input_file)
+    summarizing_profiles(profiles, sort_by, n_rows)
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(profiles, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(**args)
@@ -0,0 +1,55 @@
+import os
+import re
+import multiprocessing
+
+# number of threads given to the event loop when not set on the command line:
+# BTAGGING_N_THREADS, then the cpus of the condor slot, the cgroup cpu quota and the cpu affinity of the job
+N_THREADS_ENV = 'BTAGGING_N_THREADS'
+
+CGROUP_CPU_FILES = [
+    ('/sys/fs/cgroup/cpu.max', None),  # cgroup v2: "quota period" or "max period"
+    ('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', '/sys/fs/cgroup/cpu/cpu.cfs_period_us'),  # cgroup v1
+]
+
+
+def condor_request_cpus():
+    # cpus of the condor slot, from the job ad (or the machine ad) of the job
+    for ad_env, attribute in [('_CONDOR_JOB_AD', 'RequestCpus'), ('_CONDOR_MACHINE_AD', 'Cpus')]:
+        ad_path = os.environ.get(ad_env)
+        if not ad_path or not os.path.isfile(ad_path): continue
+        with open(ad_path) as ad_file:
+            match = re.search(r'^{}\s*=\s*(\d+)\s*$'.format(attribute), ad_file.read(), re.M)
+        if match: return int(match.group(1))
+    return None
+
+
+def cgroup_cpu_quota():
+    # cpu quota of the cgroup of the job (rounded up), None if unlimited
+    for quota_path, period_path in CGROUP_CPU_FILES:
+        try:
+            with open(quota_path) as quota_file:
+                values = quota_file.read().split()
+            if period_path:
+                with open(period_path) as period_file:
+                    values.append(period_file.read().strip())
+        except (IOError, OSError):
+            continue
+        if values[0] in ('max', '-1'): return None
+        quota, period = float(values[0]), float(values[1])
+        return max(1, int(-(-quota // period)))
+    return None
+
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return multiprocessing.cpu_count()
+
+
+def detecting_n_threads():
+    if os.environ.get(N_THREADS_ENV):
+        return int(os.environ[N_THREADS_ENV]), N_THREADS_ENV
+    for source, counting_cpus in [('condor RequestCpus', condor_request_cpus), ('cgroup cpu quota', cgroup_cpu_quota)]:
+        n_cpus = counting_cpus()
+        if n_cpus: return min(n_cpus, available_cpus()), source
+    return available_cpus(), 'cpu affinity'
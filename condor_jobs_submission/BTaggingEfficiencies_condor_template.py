@@ -1,5 +1,6 @@
 import os
 import re
+import glob
 import subprocess
 import sys
 import argparse
@@ -10,6 +11,13 @@ parser = argparse.ArgumentParser()
 
 parser.add_argument('--year', dest='year', type=str, help='Year')
 parser.add_argument('--output_dir', dest='output_dir', type=str, required=True)
+parser.add_argument('--incremental', dest='incremental', action='store_true',
+                    help='Submit only the inputs whose analyzer output is missing or out of date (see the output manifests)')
+parser.add_argument('--events_per_job', dest='events_per_job', type=int, default=5000000,
+                    help='Target number of events per job: the files of each process are packed in balanced jobs '
+                         '(0: one job per file)')
+parser.add_argument('--request_cpus', dest='request_cpus', type=int, default=1,
+                    help='Cpus requested per job, used as the number of threads of the analyzer')
 
 args = parser.parse_args()
 
@@ -22,6 +30,7 @@ process_list = []
 
 ROOT_DIR = '/nfs/dust/cms/user/gmilella/ttX_ntuplizer/'
 LOG_REPO = '{}/log'.format(os.getcwd())
+JOBS_FILE = 'BTaggingEfficiencies_condor_jobs.txt'
 
 ROOT_DIR += 'bkg_'+args.year+'_hotvr/merged/'
 
@@ -35,29 +44,98 @@ for subdir, dirs, files in os.walk(ROOT_DIR):
         file_list.append(os.path.join(subdir, file))
 print(file_list)
 
-condor_str = ''
+# the analyzer (imported only here: needs ROOT) gives the process of each file,
+# the outputs and the configuration hash
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BTaggingEfficiencyMapAnalyzer import EVENT_SELECTION, analyzer_config, naming_output_file, parsing_file
+from btagging_manifest import MANIFEST_SUFFIX, hashing_config, is_up_to_date, reading_manifest
+import ROOT
+
+def counting_entries(input_file):
+    # number of events of the Friends tree: only the file header and the tree metadata are read
+    root_file = ROOT.TFile.Open(input_file, 'READ')
+    if not root_file or root_file.IsZombie():
+        print("Input file {} could not be opened".format(input_file))
+        sys.exit(1)
+    tree = root_file.Get('Friends')
+    n_entries = tree.GetEntries() if tree else 0
+    root_file.Close()
+    return n_entries
+
+def reading_packed_jobs(output_dir, year, files_by_process):
+    # {process: [job files]} of the previous submissions, from the manifests of their outputs (newest first,
+    # older outputs sharing an input with a newer one are superseded); jobs with inputs no longer found are dropped
+    outputs_dir = os.path.join(output_dir, str(year), EVENT_SELECTION)
+    manifest_paths = sorted(glob.glob(os.path.join(outputs_dir, '*' + MANIFEST_SUFFIX)), key=lambda path: -os.path.getmtime(path))
+    packed_jobs, packed_files = OrderedDict(), set()
+    for manifest_path in manifest_paths:
+        manifest = reading_manifest(manifest_path[:-len(MANIFEST_SUFFIX)])
+        if not manifest or manifest.get('process') not in files_by_process: continue
+        job_files = sorted(manifest.get('inputs', {}).keys())
+        if packed_files & set(job_files): continue
+        if not set(job_files) <= set(files_by_process[manifest['process']]):
+            print("Inputs of {} no longer found: its files are packed again".format(manifest_path[:-len(MANIFEST_SUFFIX)]))
+            continue
+        packed_jobs.setdefault(manifest['process'], []).append(job_files)
+        packed_files |= set(job_files)
+    return packed_jobs
+
+def packing_files(files_entries, events_per_job, packed_jobs=None):
+    # files of the same process packed in jobs of at most events_per_job events (unless a file alone is larger):
+    # largest files first, each one in the job with the fewest events, a new job when it does not fit
+    # the previous jobs ([(events, files)]) are kept, so that their outputs keep their names: only the new files are packed,
+    # in the previous jobs still below events_per_job or in new jobs
+    jobs = [[n_entries, list(job_files)] for n_entries, job_files in (packed_jobs or [])]
+    packed_files = set(input_file for _, job_files in jobs for input_file in job_files)
+    for input_file, n_entries in sorted(files_entries, key=lambda file_entries: -file_entries[1]):
+        if input_file in packed_files: continue
+        job = min(jobs, key=lambda job: job[0]) if jobs else None
+        if job is None or job[0] + n_entries > events_per_job:
+            job = [0, []]
+            jobs.append(job)
+        job[0] += n_entries
+        job[1].append(input_file)
+    return [sorted(job_files) for _, job_files in jobs]
+
+files_by_process = OrderedDict()
+for inFile in sorted(file_list):
+    if not inFile.endswith('.root'): continue
+    files_by_process.setdefault(parsing_file(inFile), []).append(os.path.abspath(inFile))
+
+config_hash = hashing_config(analyzer_config(args.year))
+# jobs of the previous submissions (one job per file without packing)
+packed_jobs = reading_packed_jobs(args.output_dir, args.year, files_by_process) if args.events_per_job > 0 else {}
+jobs = []
+for process, process_files in files_by_process.items():
+    if args.events_per_job > 0:
+        files_entries = OrderedDict((inFile, counting_entries(inFile)) for inFile in process_files)
+        process_jobs = packing_files(list(files_entries.items()), args.events_per_job,
+                                     [(sum(files_entries[inFile] for inFile in job_files), job_files)
+                                      for job_files in packed_jobs.get(process, [])])
+    else:
+        process_jobs = [[inFile] for inFile in process_files]
+    for i_job, job_files in enumerate(process_jobs):
+        if args.incremental:
+            output_path = naming_output_file(job_files, process, args.output_dir, args.year)
+            if is_up_to_date(output_path, job_files, config_hash):
+                print("Up to date: {}".format(', '.join(job_files)))
+                continue
+        jobs.append(("{}_{}".format(process, i_job), job_files))
+print("{} jobs for {} files".format(len(jobs), sum(len(files) for files in files_by_process.values())))
+
+# one line per job: job name and its comma-separated input files
+with open(JOBS_FILE, 'w') as jobs_f:
+    for job_name, job_files in jobs:
+        jobs_f.write('{} {}\n'.format(job_name, ','.join(job_files)))
+
 with open('BTaggingEfficiencies_condor_submission.sub', 'w+') as condor_f_new: 
     condor_str = 'Executable = BTaggingEfficiencies_executable_BTaggingEfficiencyMapAnalyzer.sh\n'
     condor_str += 'Should_Transfer_Files = NO\nGetenv = True\nRequirements = ( OpSysAndVer == "CentOS7" )\n'
-
-    for i, inFile in enumerate(file_list):
-        if '.root' not in inFile: continue
-
-        # --- extracting file name without .root
-        match = re.search(r'([^/]+)\.root$', str(inFile))
-        if match: 
-            process_filename = match.group(1)
-        else:
-            print("File name not extracted properly...")
-            sys.exit()
-        # ---
-
-        condor_str += '\narguments = "--input_file {} --output_dir {} --year {}" '.format(inFile, args.output_dir, args.year)
-
-        condor_str += '\nOutput = {}/log_{}.$(Process).out\nError = {}/log_{}.$(Process).err\n''Log = {}/log_{}.$(Process).log\nqueue\n'.format(
-            LOG_REPO, process_filename,
-            LOG_REPO, process_filename,
-            LOG_REPO, process_filename)
+    condor_str += 'Request_Cpus = {}\n'.format(args.request_cpus)
+    condor_str += '\narguments = "--input_file $(input_files) --output_dir {} --year {}{}"\n'.format(
+        args.output_dir, args.year, ' --incremental' if args.incremental else '')
+    condor_str += 'Output = {0}/log_$(job_name).$(Process).out\nError = {0}/log_$(job_name).$(Process).err\nLog = {0}/log_$(job_name).$(Process).log\n'.format(LOG_REPO)
+    condor_str += 'queue job_name, input_files from {}\n'.format(JOBS_FILE)
 
     condor_f_new.write(condor_str)
 
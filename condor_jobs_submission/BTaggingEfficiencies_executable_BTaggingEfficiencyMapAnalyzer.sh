@@ -13,6 +13,9 @@ eval `scramv1 runtime -sh`
 
 cd /nfs/dust/cms/user/gmilella/BTaggingEfficiencyMap/condor_jobs_submission
 
+# compiled C++ helpers of the analyzer, shared by all the jobs (built by the first one)
+export BTAGGING_BUILD_DIR=/nfs/dust/cms/user/gmilella/BTaggingEfficiencyMap/build
+
 echo "ARGS: $@"
 
 #cd $_CONDOR_SCRATCH_DIR
@@ -1,4 +1,10 @@
 import os, sys
+import glob
+import json
+import fnmatch
+import multiprocessing
+from collections import OrderedDict
+import numpy as np
 import ROOT
 from array import array
 import argparse
@@ -6,6 +12,15 @@ import yaml
 import re
 from yaml.loader import SafeLoader
 from argparse import ArgumentParser
+from btagging_efficiency_lookup import HADRON_FLAVORS, MAP_VALUES
+from btagging_manifest import hashing_config, is_up_to_date, reading_manifest, recording_output, removing_manifest
+from btagging_metadata import load_yaml
+# normalization of the processes of the group maps (the analyzer imports ROOT only when processing)
+from BTaggingEfficiencyMapAnalyzer import LUMINOSITY, XSEC_FILE, SUM_GEN_WEIGHTS_FILE
+try:
+    from scipy.stats import beta as beta_distribution
+except ImportError:
+    beta_distribution = None
 
 
 LEPTON_SELECTION = ['ee', 'emu', 'mumu']
@@ -30,17 +45,48 @@ VARIABLES_BINNING = {
 
 EVENT_SELECTION = "after_2OS"
 
+# lepton selection of the maps at the top level of the map files (the only one before the per-selection directories)
+TOP_LEVEL_SELECTION = 'ee'
+
+# binomial intervals of the efficiencies (68.27% CL)
+EFFICIENCY_INTERVALS = ['clopper_pearson', 'wilson']
+EFFICIENCY_INTERVAL_CL = 0.682689492
+
+# portable exports of all the maps of a year: NumPy arrays (read by btagging_efficiency_lookup.py)
+# and correctionlib JSON (schema version 2)
+EXPORT_FORMATS = ['npz', 'json']
+
+# the analyzer outputs are merged per process in efficiencyMaps/merged (with their manifest)
+MERGE_CONFIG_HASH = hashing_config({'event_selection': EVENT_SELECTION, 'lepton_selection': LEPTON_SELECTION})
+
 class Processor:
-    def __init__(self, input_file, output_dir, year):
+    def __init__(self, input_file, output_dir, year, n_workers=1, efficiency_interval='clopper_pearson', min_effective_entries=0,
+                 export=None, incremental=False, groups=None, normalized_inputs=False):
 
-        self.input_file = input_file
+        # a single (hadd-ed) file or the list of the analyzer outputs to be merged
+        if isinstance(input_file, (list, tuple)):
+            self.input_files = list(input_file)
+        else:
+            self.input_files = [input_file]
+        self.input_file = self.input_files[0]
         self.output_dir = output_dir
         self.year = year
+        self.n_workers = n_workers
+        self.efficiency_interval = efficiency_interval
+        self.min_effective_entries = min_effective_entries
+        self.export = export or []
+        self.incremental = incremental
+        # {group: [process patterns]}: maps of the sum of the processes of each group
+        self.groups = groups or OrderedDict()
+        self.normalized_inputs = normalized_inputs
         self.lepton_selection = LEPTON_SELECTION
 
         self.output_file = self._creation_output_file() 
 
-        self.all_bkgs = {}
+        # {lepton selection or 'all': {process: {flavor: {WP: histo}}}}
+        self.all_bkgs = OrderedDict((lepton_selection, {}) for lepton_selection in LEPTON_SELECTION + ['all'])
+        # {(process, lepton selection, flavor, WP): {'pt_edges', 'eta_edges', 'efficiency', 'error', 'down', 'up'}}
+        self.exported_maps = OrderedDict()
 
     def _creation_output_file(self):
         # check if dir exist
@@ -50,128 +96,708 @@ class Processor:
 
         return self.output_dir
 
-    def _merging_bkg(self, root_input_file, lepton_selection='ee'):
-        root_input_file.cd(lepton_selection)
-        current_dir = ROOT.gDirectory
-        for key in current_dir.GetListOfKeys():
-            histo = key.ReadObj()
-            histo_name = histo.GetName()
-
-            if 'etaVSpt' not in histo_name: continue 
-
-            match = re.search(r'(.*?)_ak4', histo_name)
-            if match: process = match.group(1)
-            else: continue
-            self.all_bkgs.setdefault(process, {})
-
-            match = re.search(r'flavor_(.*?)_', histo_name)
-            if match: flavor = match.group(1)
-            else: continue
-            self.all_bkgs[process].setdefault(flavor, {})
-
-            match = re.search(r'WP_(.*?)_flavor', histo_name)
-            if match: 
-                wp_btagging = match.group(1)
-                if wp_btagging in self.all_bkgs[process][flavor].keys(): 
-                    self.all_bkgs[process][flavor][wp_btagging].Add(histo)
-                else: self.all_bkgs[process][flavor][wp_btagging] = histo
-
-            else: 
-                if 'no_btagged' in self.all_bkgs[process][flavor].keys(): 
-                    self.all_bkgs[process][flavor]['no_btagged'].Add(histo)
-                else: self.all_bkgs[process][flavor]['no_btagged'] = histo
-
-            # print(process, flavor, wp_btagging)
-
-
-    def _makeEfficiencyMaps(self, root_input_file):
-
-        self._merging_bkg(root_input_file)
-
-        for process in self.all_bkgs.keys():
+    def _merging_bkg(self, root_input_file):
+        # each input file is read once for all the lepton selections
+        # efficiency cubes (--output_format cube of the analyzer) are projected
+        # on the eta vs pt histograms of each lepton selection
+        self._merging_efficiency_cubes(root_input_file)
+
+        for lepton_selection in LEPTON_SELECTION:
+            current_dir = root_input_file.GetDirectory(lepton_selection)
+            if not current_dir: continue
+
+            # only the eta vs pt histograms found in the key index are deserialized
+            for (process, flavor, wp_btagging), keys in indexing_histo_keys(current_dir).items():
+                for key in keys:
+                    self._adding_to_bkg(lepton_selection, process, flavor, wp_btagging, key.ReadObj())
+
+                # print(process, flavor, wp_btagging)
+
+    def _merging_efficiency_cubes(self, root_input_file):
+        for key in root_input_file.GetListOfKeys():
+            if 'efficiencyCube' not in key.GetName(): continue
+            cube = key.ReadObj()
+            process = cube.GetName().split('_ak4')[0]
+
+            flavor_axis, wp_axis = cube.GetAxis(2), cube.GetAxis(3)
+            for lepton_selection in LEPTON_SELECTION:
+                for i_flavor in range(1, flavor_axis.GetNbins() + 1):
+                    for i_wp in range(1, wp_axis.GetNbins() + 1):
+                        flavor, wp_btagging = flavor_axis.GetBinLabel(i_flavor), wp_axis.GetBinLabel(i_wp)
+                        histo = projecting_efficiency_cube(cube, flavor, wp_btagging, lepton_selection)
+                        self._adding_to_bkg(lepton_selection, process, flavor, wp_btagging, histo)
+
+    def _combining_lepton_selections(self):
+        # 'all': sum of the dilepton selections
+        for lepton_selection in LEPTON_SELECTION:
+            for process, flavors in self.all_bkgs[lepton_selection].items():
+                for flavor, histos in flavors.items():
+                    for wp_btagging, histo in histos.items():
+                        histo_all = histo.Clone(histo.GetName()[:-len(lepton_selection)] + 'all')
+                        histo_all.SetDirectory(0)
+                        self._adding_to_bkg('all', process, flavor, wp_btagging, histo_all)
+
+    def _adding_to_bkg(self, lepton_selection, process, flavor, wp_btagging, histo):
+        bkgs = self.all_bkgs[lepton_selection]
+        bkgs.setdefault(process, {})
+        bkgs[process].setdefault(flavor, {})
+        if wp_btagging in bkgs[process][flavor].keys(): 
+            bkgs[process][flavor][wp_btagging].Add(histo)
+        else: bkgs[process][flavor][wp_btagging] = histo
+
+
+    def _makeEfficiencyMaps(self, root_input_files):
+
+        for root_input_file in root_input_files:
+            self._merging_bkg(root_input_file)
+        self._combining_lepton_selections()
+        if self.groups:
+            self._grouping_processes()
+
+        for process in self.all_bkgs['all'].keys():
             output_file = ROOT.TFile('{}/{}_efficiencyMap.root'.format(self.output_dir, process), 'RECREATE')
-            for flavor in self.all_bkgs[process].keys():
-
-                # etaVSpt per jet flavor - no b-tagging applied 
-                denominatorIn = self.all_bkgs[process][flavor]['no_btagged']
-
-                # xShift = denominatorIn.GetBinWidth(1)/2.
-                # yShift = denominatorIn.GetYaxis().GetBinWidth(1)/2.
-
-                # binsX = array('d', VARIABLES_BINNING['pt'])
-                # binsY = array('d', VARIABLES_BINNING['eta'])
-
-                denominatorOut = denominatorIn.Clone('denominator_' + flavor)
-                # ROOT.TH2F('denominator_' + flavor, '', (len(binsX)-1), binsX, (len(binsY)-1), binsY)
-                denominatorOut.Write()
-
-                for WP in B_TAGGING_WP[str(self.year)].keys():
-                    numeratorIn = self.all_bkgs[process][flavor][WP]
-
-                    numeratorOut = numeratorIn.Clone('numerator_' + flavor + '_' + WP)
-                    # ROOT.TH2F('numerator_' + flavor + '_' + WP, '', (len(binsX)-1), binsX, (len(binsY)-1), binsY)
-                    # efficiencyOut = ROOT.TH2F('efficiency_' + flavor + '_' + WP, '', (len(binsX)-1), binsX, (len(binsY)-1), binsY)
-
-                    # loop over all bins
-                    # for binx in range(1, denominatorOut.GetXaxis().GetNbins() + 1):
-                    #   for biny in range(1, denominatorOut.GetYaxis().GetNbins() + 1):
-
-                    #     binXMin = denominatorIn.GetXaxis().FindBin(denominatorOut.GetXaxis().GetBinLowEdge(binx)+xShift)
-                    #     binXMax = denominatorIn.GetXaxis().FindBin(denominatorOut.GetXaxis().GetBinUpEdge(binx)-xShift)
-                    #     binYMinPos = denominatorIn.GetYaxis().FindBin(denominatorOut.GetYaxis().GetBinLowEdge(biny)+yShift)
-                    #     binYMaxPos = denominatorIn.GetYaxis().FindBin(denominatorOut.GetYaxis().GetBinUpEdge(biny)-yShift)
-                    #     binYMinNeg = denominatorIn.GetYaxis().FindBin(-denominatorOut.GetYaxis().GetBinUpEdge(biny)+yShift)
-                    #     binYMaxNeg = denominatorIn.GetYaxis().FindBin(-denominatorOut.GetYaxis().GetBinLowEdge(biny)-yShift)
-
-                    #     denominator = denominatorIn.Integral(binXMin,binXMax,binYMinPos,binYMaxPos)
-                    #     denominator = denominator + denominatorIn.Integral(binXMin,binXMax,binYMinNeg,binYMaxNeg)
-                    #     numerator = numeratorIn.Integral(binXMin,binXMax,binYMinPos,binYMaxPos)
-                    #     numerator = numerator + numeratorIn.Integral(binXMin,binXMax,binYMinNeg,binYMaxNeg)
-
-                    #     if(binx==denominatorOut.GetXaxis().GetNbins()): # also add overflow to the last bin in jet pT
-                    #         denominator = denominator + denominatorIn.Integral(binXMax+1,denominatorIn.GetXaxis().GetNbins()+1,binYMinPos,binYMaxPos)
-                    #         denominator = denominator + denominatorIn.Integral(binXMax+1,denominatorIn.GetXaxis().GetNbins()+1,binYMinNeg,binYMaxNeg)
-                    #         numerator = numerator + numeratorIn.Integral(binXMax+1,numeratorIn.GetXaxis().GetNbins()+1,binYMinPos,binYMaxPos)
-                    #         numerator = numerator + numeratorIn.Integral(binXMax+1,numeratorIn.GetXaxis().GetNbins()+1,binYMinNeg,binYMaxNeg)
-
-                    #     denominatorOut.SetBinContent(binx,biny,denominator)
-                    #     numeratorOut.SetBinContent(binx,biny,numerator)
-                    #     if(denominator>0.): efficiencyOut.SetBinContent(binx,biny,numerator/denominator)
-
-                    # check if there are any bins with 0 or 100% efficiency
-                    # for binx in range(1,denominatorOut.GetXaxis().GetNbins()+1):
-                    #     for biny in range(1,denominatorOut.GetYaxis().GetNbins()+1):
-
-                    #         efficiency = efficiencyOut.GetBinContent(binx,biny)
-                    #         if(efficiency==0. or efficiency==1.):
-                    #             print('Warning! Bin({}inx,{}inx) for {} jets has a b-tagging efficiency of {}'.format(binx,biny,flavor,efficiency))
-
-                    efficiencyOut = numeratorIn.Clone('efficiency_' + flavor + '_' + WP)
-                    efficiencyOut.Divide(denominatorIn)
-
-                    # set efficiencies in overflow bins
-                    for binx in range(1,denominatorOut.GetXaxis().GetNbins()+1):
-                        efficiencyOut.SetBinContent(binx, denominatorOut.GetYaxis().GetNbins()+1, efficiencyOut.GetBinContent(binx, denominatorOut.GetYaxis().GetNbins()))
-                    for biny in range(1,denominatorOut.GetYaxis().GetNbins()+2):
-                        efficiencyOut.SetBinContent(denominatorOut.GetXaxis().GetNbins()+1, biny, efficiencyOut.GetBinContent(denominatorOut.GetXaxis().GetNbins(), biny))
-
-                    numeratorOut.Write()
-                    efficiencyOut.Write()
+            process_binning = OrderedDict()
+            # one directory per lepton selection, plus their combination ('all')
+            for lepton_selection in self.all_bkgs.keys():
+                if process not in self.all_bkgs[lepton_selection]: continue
+                process_bkgs = self.all_bkgs[lepton_selection][process]
+                output_file.mkdir(lepton_selection).cd()
+
+                flavors = list(process_bkgs.keys())
+                wps = list(B_TAGGING_WP[str(self.year)].keys())
+                if self.min_effective_entries > 0:
+                    # each flavor gets its own binning: efficiencies computed per flavor
+                    process_bkgs, process_binning[lepton_selection] = self._rebinning_bkgs(process_bkgs)
+                    flavor_maps = [computing_efficiency_maps(
+                        [[process_bkgs[flavor][WP] for WP in wps]], [process_bkgs[flavor]['no_btagged']],
+                        self.efficiency_interval) for flavor in flavors]
+                    efficiency_maps = dict((key, [maps[key][0] for maps in flavor_maps]) for key in flavor_maps[0].keys())
+                else:
+                    # efficiencies and their intervals for all the flavors and WPs at once
+                    efficiency_maps = computing_efficiency_maps(
+                        [[process_bkgs[flavor][WP] for WP in wps] for flavor in flavors],
+                        [process_bkgs[flavor]['no_btagged'] for flavor in flavors],
+                        self.efficiency_interval)
+
+                for i_flavor, flavor in enumerate(flavors):
+
+                    # etaVSpt per jet flavor - no b-tagging applied 
+                    denominatorIn = process_bkgs[flavor]['no_btagged']
+
+                    # xShift = denominatorIn.GetBinWidth(1)/2.
+                    # yShift = denominatorIn.GetYaxis().GetBinWidth(1)/2.
+
+                    # binsX = array('d', VARIABLES_BINNING['pt'])
+                    # binsY = array('d', VARIABLES_BINNING['eta'])
+
+                    denominatorOut = denominatorIn.Clone('denominator_' + flavor)
+                    # ROOT.TH2F('denominator_' + flavor, '', (len(binsX)-1), binsX, (len(binsY)-1), binsY)
+                    denominatorOut.Write()
+
+                    for i_wp, WP in enumerate(wps):
+                        numeratorIn = process_bkgs[flavor][WP]
+
+                        numeratorOut = numeratorIn.Clone('numerator_' + flavor + '_' + WP)
+                        # ROOT.TH2F('numerator_' + flavor + '_' + WP, '', (len(binsX)-1), binsX, (len(binsY)-1), binsY)
+                        # efficiencyOut = ROOT.TH2F('efficiency_' + flavor + '_' + WP, '', (len(binsX)-1), binsX, (len(binsY)-1), binsY)
+
+                        # loop over all bins
+                        # for binx in range(1, denominatorOut.GetXaxis().GetNbins() + 1):
+                        #   for biny in range(1, denominatorOut.GetYaxis().GetNbins() + 1):
+
+                        #     binXMin = denominatorIn.GetXaxis().FindBin(denominatorOut.GetXaxis().GetBinLowEdge(binx)+xShift)
+                        #     binXMax = denominatorIn.GetXaxis().FindBin(denominatorOut.GetXaxis().GetBinUpEdge(binx)-xShift)
+                        #     binYMinPos = denominatorIn.GetYaxis().FindBin(denominatorOut.GetYaxis().GetBinLowEdge(biny)+yShift)
+                        #     binYMaxPos = denominatorIn.GetYaxis().FindBin(denominatorOut.GetYaxis().GetBinUpEdge(biny)-yShift)
+                        #     binYMinNeg = denominatorIn.GetYaxis().FindBin(-denominatorOut.GetYaxis().GetBinUpEdge(biny)+yShift)
+                        #     binYMaxNeg = denominatorIn.GetYaxis().FindBin(-denominatorOut.GetYaxis().GetBinLowEdge(biny)-yShift)
+
+                        #     denominator = denominatorIn.Integral(binXMin,binXMax,binYMinPos,binYMaxPos)
+                        #     denominator = denominator + denominatorIn.Integral(binXMin,binXMax,binYMinNeg,binYMaxNeg)
+                        #     numerator = numeratorIn.Integral(binXMin,binXMax,binYMinPos,binYMaxPos)
+                        #     numerator = numerator + numeratorIn.Integral(binXMin,binXMax,binYMinNeg,binYMaxNeg)
+
+                        #     if(binx==denominatorOut.GetXaxis().GetNbins()): # also add overflow to the last bin in jet pT
+                        #         denominator = denominator + denominatorIn.Integral(binXMax+1,denominatorIn.GetXaxis().GetNbins()+1,binYMinPos,binYMaxPos)
+                        #         denominator = denominator + denominatorIn.Integral(binXMax+1,denominatorIn.GetXaxis().GetNbins()+1,binYMinNeg,binYMaxNeg)
+                        #         numerator = numerator + numeratorIn.Integral(binXMax+1,numeratorIn.GetXaxis().GetNbins()+1,binYMinPos,binYMaxPos)
+                        #         numerator = numerator + numeratorIn.Integral(binXMax+1,numeratorIn.GetXaxis().GetNbins()+1,binYMinNeg,binYMaxNeg)
+
+                        #     denominatorOut.SetBinContent(binx,biny,denominator)
+                        #     numeratorOut.SetBinContent(binx,biny,numerator)
+                        #     if(denominator>0.): efficiencyOut.SetBinContent(binx,biny,numerator/denominator)
+
+                        # check if there are any bins with 0 or 100% efficiency
+                        # for binx in range(1,denominatorOut.GetXaxis().GetNbins()+1):
+                        #     for biny in range(1,denominatorOut.GetYaxis().GetNbins()+1):
+
+                        #         efficiency = efficiencyOut.GetBinContent(binx,biny)
+                        #         if(efficiency==0. or efficiency==1.):
+                        #             print('Warning! Bin({}inx,{}inx) for {} jets has a b-tagging efficiency of {}'.format(binx,biny,flavor,efficiency))
+
+                        # efficiencies (overflow bins included) with the half width of the interval as error,
+                        # plus the lower and upper bounds of the interval
+                        efficiencyOut = numeratorIn.Clone('efficiency_' + flavor + '_' + WP)
+                        efficiencyOut.SetContent(efficiency_maps['efficiency'][i_flavor][i_wp])
+                        efficiencyOut.SetError(efficiency_maps['error'][i_flavor][i_wp])
+
+                        numeratorOut.Write()
+                        efficiencyOut.Write()
+                        for bound in ['down', 'up']:
+                            efficiencyBoundOut = numeratorIn.Clone('efficiency_' + flavor + '_' + WP + '_' + bound)
+                            efficiencyBoundOut.SetContent(efficiency_maps[bound][i_flavor][i_wp])
+                            efficiencyBoundOut.SetError(np.zeros(efficiencyBoundOut.GetNcells()))
+                            efficiencyBoundOut.Write()
+
+                        if self.export:
+                            self._adding_to_export((process, lepton_selection, flavor, WP), denominatorIn, efficiency_maps, i_flavor, i_wp)
+
+                if lepton_selection == TOP_LEVEL_SELECTION:
+                    # the maps of this selection are also kept at the top level of the file,
+                    # with the names and content they had before the per-selection directories
+                    for key in output_file.GetDirectory(lepton_selection).GetListOfKeys():
+                        output_file.cd()
+                        key.ReadObj().Write()
             output_file.Close()
 
+            if process_binning:
+                binning_path = '{}/{}_efficiencyMap_binning.json'.format(self.output_dir, process)
+                with open(binning_path, 'w') as binning_file:
+                    json.dump(process_binning, binning_file, indent=2)
+                print('binning stored in {}'.format(binning_path))
+
             print('-------------------------------------------------------------------------------------------')
             print('b-tagging efficiency map for ', process)
             output_path = self.output_dir + '/' + process + '_bTaggingEfficiencyMap.root'
             print('successfully created and stored in %s\n'%(output_path))
 
 
-    def process(self):
-        root_input_file = ROOT.TFile(str(self.input_file), 'r')
-        print("Process: {}".format(str(self.input_file)))
+    def _grouping_processes(self):
+        # the numerators and denominators of the processes of each group are scaled by xsec * lumi / sum of gen weights
+        # and summed as arrays, from the histograms already in memory: the groups are then processed as the other processes
+        processes = list(self.all_bkgs['all'].keys())
+        for group, patterns in self.groups.items():
+            if group in processes:
+                print("Group {} has the name of a process".format(group))
+                sys.exit(1)
+            members = [process for process in processes if any(fnmatch.fnmatchcase(process, pattern) for pattern in patterns)]
+            if not members:
+                print("No process of the group {} found (patterns: {})".format(group, patterns))
+                continue
+            scales = self._normalizing_processes(members)
+            print("Group {}: {}".format(group, ', '.join('{} (x {:.4g})'.format(process, scales[process]) for process in members)))
+
+            for lepton_selection, bkgs in self.all_bkgs.items():
+                group_members = [process for process in members if process in bkgs]
+                if not group_members: continue
+                bkgs[group] = {}
+                for flavor, histos in bkgs[group_members[0]].items():
+                    bkgs[group][flavor] = {}
+                    for wp_btagging, histo in histos.items():
+                        wp_members = [process for process in group_members if wp_btagging in bkgs[process].get(flavor, {})]
+                        bkgs[group][flavor][wp_btagging] = summing_histos(
+                            [bkgs[process][flavor][wp_btagging] for process in wp_members],
+                            [scales[process] for process in wp_members],
+                            group + histo.GetName()[len(group_members[0]):])
+
+    def _normalizing_processes(self, processes):
+        # xsec * lumi / sum of gen weights of each process, 1 for inputs already normalized (analyzer --weighted)
+        if self.normalized_inputs:
+            return dict((process, 1.) for process in processes)
+
+        # parsed once per session (and cached locally across jobs)
+        xsecs = load_yaml(XSEC_FILE)
+        sum_gen_weights = load_yaml(SUM_GEN_WEIGHTS_FILE.format(year=self.year))
+        scales = {}
+        for process in processes:
+            if not xsecs.get(process, {}).get('isUsed') or process not in sum_gen_weights:
+                print("Xsec or sum of gen weights for process {} not found in file".format(process))
+                sys.exit(1)
+            scales[process] = xsecs[process]['xSec'] * LUMINOSITY[str(self.year)] / sum_gen_weights[process]
+        return scales
+
+    def _adding_to_export(self, map_key, histo, efficiency_maps, i_flavor, i_wp):
+        # values of the bins inside the binning only, as (eta bins, pt bins) arrays
+        n_bins_x, n_bins_y = histo.GetXaxis().GetNbins(), histo.GetYaxis().GetNbins()
+        exported_map = OrderedDict([
+            ('pt_edges', np.array(axis_edges(histo.GetXaxis()))),
+            ('eta_edges', np.array(axis_edges(histo.GetYaxis()))),
+        ])
+        for values in MAP_VALUES:
+            exported_map[values] = np.array(
+                efficiency_maps[values][i_flavor][i_wp]).reshape(n_bins_y + 2, n_bins_x + 2)[1:-1, 1:-1].copy()
+        self.exported_maps[map_key] = exported_map
+
+    def _exporting_efficiency_maps(self):
+        export_path = os.path.join(self.output_dir, 'efficiencyMaps_{}'.format(self.year))
+        if 'npz' in self.export:
+            arrays = OrderedDict()
+            for map_key, exported_map in self.exported_maps.items():
+                for values, array_values in exported_map.items():
+                    arrays['/'.join(map_key + (values,))] = array_values
+            np.savez_compressed(export_path + '.npz', **arrays)
+            print("Efficiency maps exported in {}.npz".format(export_path))
+        if 'json' in self.export:
+            with open(export_path + '.json', 'w') as json_file:
+                json.dump(building_correctionlib_json(self.exported_maps, self.year), json_file)
+            print("Efficiency maps exported in {}.json".format(export_path))
+
+    def _rebinning_bkgs(self, process_bkgs):
+        # adjacent pt/eta bins are merged per flavor until each bin of the denominator
+        # reaches min_effective_entries, the numerators of all the WPs follow the same binning
+        rebinned_bkgs, binning = OrderedDict(), OrderedDict()
+        for flavor, histos in process_bkgs.items():
+            denominator = histos['no_btagged']
+            x_edges, y_edges = axis_edges(denominator.GetXaxis()), axis_edges(denominator.GetYaxis())
+            x_indices, y_indices = adaptive_binning(denominator, self.min_effective_entries)
+
+            binning[flavor] = OrderedDict([
+                ('pt', [x_edges[i] for i in x_indices]),
+                ('eta', [y_edges[i] for i in y_indices]),
+            ])
+            rebinned_bkgs[flavor] = OrderedDict(
+                (wp_btagging, rebinning_histo(histo, x_indices, y_indices)) for wp_btagging, histo in histos.items())
+            print("{} jets: pt bins {}, eta bins {}".format(flavor, binning[flavor]['pt'], binning[flavor]['eta']))
+        return rebinned_bkgs, binning
+
+    def _merging_input_files(self):
+        # replaces the hadd step: the analyzer outputs of each process are merged in efficiencyMaps/merged,
+        # with --incremental only the processes whose inputs changed are merged again
+        merged_dir = os.path.join(self.output_dir, 'merged')
+        if not os.path.exists(merged_dir):
+            os.makedirs(merged_dir)
+
+        merged_paths, files_to_merge = OrderedDict(), OrderedDict()
+        for process, files in grouping_outputs_by_process(self.input_files).items():
+            merged_paths[process] = os.path.join(merged_dir, '{}_{}_merged.root'.format(process, EVENT_SELECTION))
+            if self.incremental and is_up_to_date(merged_paths[process], files, MERGE_CONFIG_HASH):
+                print("{}: merged inputs up to date".format(process))
+                continue
+            files_to_merge[process] = files
+
+        if files_to_merge:
+            for process, histos in self._reducing_histos(files_to_merge).items():
+                removing_manifest(merged_paths[process])
+                merged_file = ROOT.TFile(merged_paths[process], 'RECREATE')
+                for (dir_name, histo_name), histo in sorted(histos.items()):
+                    if dir_name and not merged_file.GetDirectory(dir_name):
+                        merged_file.mkdir(dir_name)
+                    (merged_file.GetDirectory(dir_name) if dir_name else merged_file).cd()
+                    histo.Write(histo_name)
+                merged_file.Close()
+                recording_output(merged_paths[process], files_to_merge[process], MERGE_CONFIG_HASH, process=process)
+                print("Merged inputs of {} stored in {}".format(process, merged_paths[process]))
+        return list(merged_paths.values())
+
+    def _reducing_histos(self, files_by_process):
+        # the needed histograms of each input are read once and summed
+        # in a parallel tree reduction per process
+        n_files = sum(len(files) for files in files_by_process.values())
+        print("Merging {} input files with {} workers".format(n_files, self.n_workers))
+        tasks = []
+        for process, files in files_by_process.items():
+            n_groups = max(1, min(self.n_workers, len(files)))
+            tasks += [(process, files[i::n_groups]) for i in range(n_groups)]
+
+        pool = multiprocessing.Pool(max(1, min(self.n_workers, len(tasks))))
+        try:
+            partial_histos = OrderedDict((process, []) for process in files_by_process.keys())
+            for (process, _), histos in zip(tasks, pool.map(reading_histos, [files for _, files in tasks])):
+                partial_histos[process].append(histos)
+
+            # one round of pairwise sums for all the processes at once
+            while any(len(histos) > 1 for histos in partial_histos.values()):
+                pairs, owners = [], []
+                for process, histos in partial_histos.items():
+                    for i in range(0, len(histos) - 1, 2):
+                        pairs.append((histos[i], histos[i + 1]))
+                        owners.append(process)
+                    partial_histos[process] = histos[-1:] if len(histos) % 2 else []
+                for process, histos in zip(owners, pool.map(adding_histos, pairs)):
+                    partial_histos[process].insert(0, histos)
+        finally:
+            pool.close()
+            pool.join()
+        return OrderedDict((process, histos[0]) for process, histos in partial_histos.items())
 
-        self._makeEfficiencyMaps(root_input_file)
-
-def main(input_file, output_dir, year):
+    def process(self):
+        input_paths = self._merging_input_files() if len(self.input_files) > 1 else self.input_files
+        root_input_files = []
+        for input_path in input_paths:
+            root_input_files.append(ROOT.TFile(str(input_path), 'r'))
+            print("Process: {}".format(str(input_path)))
+
+        self._makeEfficiencyMaps(root_input_files)
+        if self.export:
+            self._exporting_efficiency_maps()
+
+def building_correctionlib_json(exported_maps, year):
+    # one correction per process and lepton selection: systematic (nominal, down, up) -> WP -> hadronFlavour -> (|eta|, pt)
+    corrections = OrderedDict()
+    for (process, lepton_selection, flavor, wp_btagging), exported_map in exported_maps.items():
+        name = '{}_{}'.format(process, lepton_selection)
+        if name not in corrections:
+            corrections[name] = OrderedDict((systematic, OrderedDict()) for systematic in ['nominal', 'down', 'up'])
+        for systematic, values in [('nominal', 'efficiency'), ('down', 'down'), ('up', 'up')]:
+            corrections[name][systematic].setdefault(wp_btagging, []).append(OrderedDict([
+                ('key', HADRON_FLAVORS[flavor]),
+                ('value', OrderedDict([
+                    ('nodetype', 'multibinning'),
+                    ('inputs', ['abseta', 'pt']),
+                    ('edges', [list(exported_map['eta_edges']), list(exported_map['pt_edges'])]),
+                    ('content', [float(value) for value in exported_map[values].ravel()]),
+                    ('flow', 'clamp'),
+                ])),
+            ]))
+
+    def category(input_name, content):
+        return OrderedDict([('nodetype', 'category'), ('input', input_name), ('content', content)])
+
+    return OrderedDict([
+        ('schema_version', 2),
+        ('description', 'b-tagging efficiencies {} (makeBTaggingEfficiencyMap.py)'.format(year)),
+        ('corrections', [OrderedDict([
+            ('name', name),
+            ('description', 'b-tagging efficiency of the {} jets, {} selection'.format(*name.rsplit('_', 1))),
+            ('version', 1),
+            ('inputs', [
+                {'name': 'systematic', 'type': 'string', 'description': 'nominal, down or up (binomial interval)'},
+                {'name': 'working_point', 'type': 'string', 'description': 'b-tagging WP'},
+                {'name': 'flavor', 'type': 'int', 'description': 'jet hadronFlavour'},
+                {'name': 'abseta', 'type': 'real', 'description': 'jet |eta|'},
+                {'name': 'pt', 'type': 'real', 'description': 'jet pt'},
+            ]),
+            ('output', {'name': 'efficiency', 'type': 'real'}),
+            ('data', category('systematic', [
+                {'key': systematic, 'value': category('working_point', [
+                    {'key': wp_btagging, 'value': category('flavor', flavors)} for wp_btagging, flavors in wps.items()])}
+                for systematic, wps in systematics.items()])),
+        ]) for name, systematics in corrections.items()]),
+    ])
+
+def parsing_histo_name(histo_name):
+    # {process}_ak4_flavor_{flavor}_etaVSpt_... -> (process, flavor, 'no_btagged')
+    # {process}_ak4_btagged_WP_{WP}_flavor_{flavor}_etaVSpt_... -> (process, flavor, WP)
+    # None for any other histogram
+    if '_etaVSpt_' not in histo_name: return None
+    process, _, histo_type = histo_name.partition('_ak4_')
+    if not histo_type: return None
+
+    if histo_type.startswith('btagged_WP_'):
+        wp_btagging, _, histo_type = histo_type[len('btagged_WP_'):].partition('_flavor_')
+    elif histo_type.startswith('flavor_'):
+        wp_btagging, histo_type = 'no_btagged', histo_type[len('flavor_'):]
+    else: return None
+
+    flavor = histo_type.partition('_')[0]
+    return process, flavor, wp_btagging
+
+def indexing_histo_keys(directory):
+    # {(process, flavor, WP): [keys]} built from the key names only, nothing is read
+    index = {}
+    seen_names = set()
+    for key in directory.GetListOfKeys():
+        histo_name = key.GetName()
+        # keys are sorted by decreasing cycle: older cycles of the same histogram are skipped
+        if histo_name in seen_names: continue
+        seen_names.add(histo_name)
+
+        parsed_name = parsing_histo_name(histo_name)
+        if parsed_name: index.setdefault(parsed_name, []).append(key)
+    return index
+
+def histo_arrays(histo):
+    # bin contents and sums of squared weights of all the cells (under/overflow included), no copy from ROOT
+    n_cells = histo.GetNcells()
+    contents = buffer_array(histo.GetArray(), n_cells, np.float32 if histo.ClassName().endswith('F') else np.float64)
+    if histo.GetSumw2N():
+        sumw2 = buffer_array(histo.GetSumw2().GetArray(), n_cells, np.float64)
+    else:
+        sumw2 = contents
+    return contents, sumw2
+
+def buffer_array(values, n_cells, dtype):
+    # pointers of unknown size have to be shaped before being read as buffers
+    if hasattr(values, 'reshape'):
+        reshaped = values.reshape((n_cells,))
+        if reshaped is not None: values = reshaped
+    return np.frombuffer(values, dtype=dtype, count=n_cells).astype(np.float64)
+
+def computing_efficiency_maps(numerator_histos, denominator_histos, interval='clopper_pearson'):
+    # numerator_histos: [flavor][WP], denominator_histos: [flavor]
+    # returns {'efficiency', 'error', 'down', 'up'}: arrays of shape (flavors, WPs, cells)
+    # with the overflow bins set as the last bins (jet pt and eta above the binning)
+    numerators = [[histo_arrays(histo) for histo in histos] for histos in numerator_histos]
+    denominators = [histo_arrays(histo) for histo in denominator_histos]
+    num = np.array([[contents for contents, _ in arrays] for arrays in numerators])
+    den = np.array([contents for contents, _ in denominators])[:, np.newaxis, :]
+    den_sumw2 = np.array([sumw2 for _, sumw2 in denominators])[:, np.newaxis, :]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        valid = (den > 0) & (den_sumw2 > 0)
+        efficiency = np.where(valid, num / den, 0.)
+        # effective number of entries (the number of entries for unweighted histograms)
+        n_eff = np.where(valid, den ** 2 / den_sumw2, 0.) * np.ones_like(efficiency)
+        k_eff = np.clip(efficiency, 0., 1.) * n_eff
+        down, up = binomial_intervals(k_eff, n_eff, interval)
+    down = np.where(valid, down, efficiency)
+    up = np.where(valid, up, efficiency)
+
+    n_bins_x = denominator_histos[0].GetXaxis().GetNbins()
+    n_bins_y = denominator_histos[0].GetYaxis().GetNbins()
+    efficiency_maps = {
+        'efficiency': efficiency, 'error': (up - down) / 2.,
+        'down': down, 'up': up,
+    }
+    for key, values in efficiency_maps.items():
+        efficiency_maps[key] = filling_overflow_bins(np.ascontiguousarray(values), n_bins_x, n_bins_y)
+    return efficiency_maps
+
+def binomial_intervals(k, n, interval='clopper_pearson', cl=EFFICIENCY_INTERVAL_CL):
+    if interval == 'clopper_pearson' and beta_distribution is None:
+        print("scipy not available: using Wilson intervals instead of Clopper-Pearson")
+        interval = 'wilson'
+
+    if interval == 'clopper_pearson':
+        alpha = 1. - cl
+        down = np.where(k > 0, beta_distribution.ppf(alpha / 2., k, n - k + 1), 0.)
+        up = np.where(k < n, beta_distribution.ppf(1. - alpha / 2., k + 1, n - k), 1.)
+    else:
+        z = np.sqrt(2.) * ROOT.TMath.ErfInverse(cl)
+        center = (k + z ** 2 / 2.) / (n + z ** 2)
+        half_width = z / (n + z ** 2) * np.sqrt(k * (n - k) / n + z ** 2 / 4.)
+        down, up = center - half_width, center + half_width
+    return np.nan_to_num(down), np.nan_to_num(up)
+
+def filling_overflow_bins(values, n_bins_x, n_bins_y):
+    # the cells of a TH2 are ordered as x + (n_bins_x + 2) * y
+    shape = values.shape
+    values = values.reshape(shape[:-1] + (n_bins_y + 2, n_bins_x + 2))
+    values[..., n_bins_y + 1, 1:n_bins_x + 1] = values[..., n_bins_y, 1:n_bins_x + 1]
+    values[..., 1:n_bins_y + 2, n_bins_x + 1] = values[..., 1:n_bins_y + 2, n_bins_x]
+    return values.reshape(shape)
+
+def axis_edges(axis):
+    return [axis.GetBinLowEdge(i) for i in range(1, axis.GetNbins() + 1)] + [axis.GetBinUpEdge(axis.GetNbins())]
+
+def merging_bins(sumw, sumw2, min_effective_entries):
+    # sumw, sumw2: arrays (groups, bins); returns the indices of the edges of the merged bins
+    # adjacent bins are merged from the first one until all the groups reach min_effective_entries
+    # ((sum of weights)^2 / sum of squared weights), a last bin below threshold is merged with the previous one
+    # the sums over any range of bins are taken from the cumulative sums
+    zeros = np.zeros((sumw.shape[0], 1))
+    cumulative_sumw = np.concatenate([zeros, np.cumsum(sumw, axis=1)], axis=1)
+    cumulative_sumw2 = np.concatenate([zeros, np.cumsum(sumw2, axis=1)], axis=1)
+    n_bins = sumw.shape[1]
+
+    edges = [0]
+    while edges[-1] < n_bins:
+        start = edges[-1]
+        range_sumw = cumulative_sumw[:, start + 1:] - cumulative_sumw[:, start:start + 1]
+        range_sumw2 = cumulative_sumw2[:, start + 1:] - cumulative_sumw2[:, start:start + 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            n_eff = np.where(range_sumw2 > 0, range_sumw ** 2 / range_sumw2, 0.)
+        enough = np.all(n_eff >= min_effective_entries, axis=0)
+        if not enough.any():
+            if len(edges) > 1: edges[-1] = n_bins
+            else: edges.append(n_bins)
+            break
+        edges.append(start + 1 + int(np.argmax(enough)))
+    return edges
+
+def adaptive_binning(histo, min_effective_entries):
+    # eta bins are merged first (on the eta projection), then pt bins for all the merged eta bins at once
+    # returns the indices (in the axis edges) of the pt and eta edges kept
+    n_bins_x, n_bins_y = histo.GetXaxis().GetNbins(), histo.GetYaxis().GetNbins()
+    contents, sumw2 = histo_arrays(histo)
+    sumw = contents.reshape(n_bins_y + 2, n_bins_x + 2)[1:-1, 1:-1]
+    sumw2 = sumw2.reshape(n_bins_y + 2, n_bins_x + 2)[1:-1, 1:-1]
+
+    y_indices = merging_bins(sumw.sum(axis=1)[np.newaxis, :], sumw2.sum(axis=1)[np.newaxis, :], min_effective_entries)
+    x_indices = merging_bins(np.add.reduceat(sumw, y_indices[:-1], axis=0),
+                             np.add.reduceat(sumw2, y_indices[:-1], axis=0), min_effective_entries)
+    return x_indices, y_indices
+
+def rebinning_histo(histo, x_indices, y_indices):
+    # merges the bins of a TH2 keeping the edges of index x_indices and y_indices (under/overflow bins kept)
+    n_bins_x, n_bins_y = histo.GetXaxis().GetNbins(), histo.GetYaxis().GetNbins()
+    x_edges = [axis_edges(histo.GetXaxis())[i] for i in x_indices]
+    y_edges = [axis_edges(histo.GetYaxis())[i] for i in y_indices]
+    x_starts = [0] + [i + 1 for i in x_indices[:-1]] + [n_bins_x + 1]
+    y_starts = [0] + [i + 1 for i in y_indices[:-1]] + [n_bins_y + 1]
+
+    rebinned_histo = ROOT.TH2D(histo.GetName() + '_rebinned', histo.GetTitle(),
+                               len(x_edges) - 1, array('d', x_edges), len(y_edges) - 1, array('d', y_edges))
+    rebinned_histo.SetDirectory(0)
+    contents, sumw2 = histo_arrays(histo)
+    rebinned_values = []
+    for values in [contents, sumw2]:
+        values = values.reshape(n_bins_y + 2, n_bins_x + 2)
+        values = np.add.reduceat(np.add.reduceat(values, y_starts, axis=0), x_starts, axis=1)
+        rebinned_values.append(np.ascontiguousarray(values.ravel()))
+    rebinned_histo.SetContent(rebinned_values[0])
+    rebinned_histo.SetError(np.sqrt(rebinned_values[1]))
+    rebinned_histo.SetEntries(histo.GetEntries())
+    return rebinned_histo
+
+def summing_histos(histos, scales, name):
+    # sum of the scaled eta vs pt histograms (same binning), computed on the arrays of their cells
+    # (under/overflow included) with the sums of squared weights
+    n_cells = histos[0].GetNcells()
+    if any(histo.GetNcells() != n_cells for histo in histos):
+        print("Histograms of {} with different binnings: {}".format(name, [histo.GetName() for histo in histos]))
+        sys.exit(1)
+    contents, sumw2 = np.zeros(n_cells), np.zeros(n_cells)
+    for histo, scale in zip(histos, scales):
+        histo_contents, histo_sumw2 = histo_arrays(histo)
+        contents += scale * histo_contents
+        sumw2 += scale ** 2 * histo_sumw2
+
+    x_edges, y_edges = axis_edges(histos[0].GetXaxis()), axis_edges(histos[0].GetYaxis())
+    summed_histo = ROOT.TH2D(name, histos[0].GetTitle(),
+                             len(x_edges) - 1, array('d', x_edges), len(y_edges) - 1, array('d', y_edges))
+    summed_histo.SetDirectory(0)
+    summed_histo.SetContent(contents)
+    summed_histo.SetError(np.sqrt(sumw2))
+    summed_histo.SetEntries(sum(histo.GetEntries() for histo in histos))
+    return summed_histo
+
+def reading_groups(groups_file):
+    # yaml file {group: [process patterns]}, e.g. {dy: ['dy_ht_*'], tt: [tt_dilepton, tt_semileptonic], all_bkg: ['*']}
+    if not groups_file: return OrderedDict()
+    groups = load_yaml(groups_file)
+    if not isinstance(groups, dict):
+        print("Groups file {} should map each group to a list of process patterns".format(groups_file))
+        sys.exit(1)
+    return OrderedDict((str(group), [patterns] if isinstance(patterns, str) else [str(pattern) for pattern in patterns])
+                       for group, patterns in groups.items())
+
+def reading_histos(input_files):
+    # reads only the keys used by the efficiency maps (eta vs pt histograms and efficiency cubes)
+    # returns {(directory, histogram name): histogram} summed over the input files
+    histos = {}
+    for input_file in input_files:
+        root_file = ROOT.TFile.Open(str(input_file), 'READ')
+        if not root_file or root_file.IsZombie():
+            print("Input file {} could not be opened".format(input_file))
+            sys.exit(1)
+        for dir_name in [''] + LEPTON_SELECTION:
+            directory = root_file.GetDirectory(dir_name) if dir_name else root_file
+            if not directory: continue
+            seen_names = set()
+            for key in directory.GetListOfKeys():
+                key_name = key.GetName()
+                # keys are sorted by decreasing cycle: older cycles of the same histogram are skipped
+                if key_name in seen_names: continue
+                seen_names.add(key_name)
+                if not parsing_histo_name(key_name) and 'efficiencyCube' not in key_name: continue
+                if (dir_name, key_name) in histos: 
+                    histos[(dir_name, key_name)].Add(key.ReadObj())
+                    continue
+                histo = key.ReadObj()
+                if hasattr(histo, 'SetDirectory'): histo.SetDirectory(0)
+                histos[(dir_name, key_name)] = histo
+        root_file.Close()
+    return histos
+
+def grouping_outputs_by_process(input_files):
+    # the process of each analyzer output is taken from its manifest,
+    # outputs without manifest are merged on their own
+    files_by_process = OrderedDict()
+    for input_file in input_files:
+        manifest = reading_manifest(str(input_file)) or {}
+        process = manifest.get('process') or os.path.basename(str(input_file)).split('_BTaggingEfficiencyMapAnalyzer_output')[0]
+        files_by_process.setdefault(process, []).append(input_file)
+    for process, files in files_by_process.items():
+        files_by_process[process] = dropping_superseded_outputs(process, files)
+    return files_by_process
+
+def dropping_superseded_outputs(process, output_files):
+    # outputs of the same process sharing an input file (e.g. after a new grouping of the chunks) would count
+    # its events twice: the newest outputs are kept, an older one whose inputs are all covered by them is skipped,
+    # and an older one covering only part of its inputs cannot be merged without double counting
+    manifests = dict((str(output_file), reading_manifest(str(output_file))) for output_file in output_files)
+    with_manifest = [output_file for output_file in output_files if manifests[str(output_file)]]
+    covered, kept = set(), set()
+    for output_file in sorted(with_manifest, key=lambda output_file: -os.path.getmtime(str(output_file))):
+        inputs = set(manifests[str(output_file)].get('inputs', {}).keys())
+        shared = inputs & covered
+        if not shared:
+            kept.add(str(output_file))
+            covered |= inputs
+        elif shared == inputs:
+            print("{}: {} superseded by newer outputs of the same inputs, skipped".format(process, output_file))
+        else:
+            print("{}: {} shares {} of its {} inputs with newer outputs: process the remaining inputs again "
+                  "or remove the superseded output".format(process, output_file, len(shared), len(inputs)))
+            sys.exit(1)
+    return [output_file for output_file in output_files
+            if str(output_file) in kept or not manifests[str(output_file)]]
+
+def adding_histos(histos_pair):
+    histos, other_histos = histos_pair
+    for key, histo in other_histos.items():
+        if key in histos: histos[key].Add(histo)
+        else: histos[key] = histo
+    return histos
+
+def formatting_year_inputs(inputs, year, n_years=1):
+    # '{year}' in the input paths is replaced by the era (mandatory when several eras are processed)
+    if n_years > 1 and not any('{year}' in inp for inp in inputs):
+        print("Several years given: use the '{year}' placeholder in the input paths")
+        sys.exit(1)
+    return [inp.replace('{year}', year) for inp in inputs]
+
+def expanding_input_files(inputs):
+    # inputs can be root files, glob patterns or directories with the analyzer outputs
+    input_files = []
+    for inp in inputs:
+        if os.path.isdir(inp):
+            input_files.extend(sorted(glob.glob(os.path.join(inp, '*.root'))))
+        elif glob.has_magic(inp):
+            input_files.extend(sorted(glob.glob(inp)))
+        else:
+            input_files.append(inp)
+    if not input_files:
+        print("No input files found in {}".format(inputs))
+        sys.exit(1)
+    return input_files
+
+def projecting_efficiency_cube(cube, flavor, wp_btagging, lepton_selection):
+    # eta vs pt projection of the efficiency cube (pt x eta x flavor x WP x lepton selection)
+    # named as the corresponding histogram of the analyzer 'histos' output format
+    process = cube.GetName().split('_ak4')[0]
+    event_selection = cube.GetName().split('efficiencyCube_')[-1]
+    if wp_btagging == 'no_btagged':
+        histo_name = "{}_ak4_flavor_{}_etaVSpt_{}_{}".format(process, flavor, event_selection, lepton_selection)
+    else:
+        histo_name = "{}_ak4_btagged_WP_{}_flavor_{}_etaVSpt_{}_{}".format(process, wp_btagging, flavor, event_selection, lepton_selection)
+
+    for i_axis, label in zip([2, 3, 4], [flavor, wp_btagging, lepton_selection]):
+        axis = cube.GetAxis(i_axis)
+        i_bin = axis.FindFixBin(label)
+        axis.SetRange(i_bin, i_bin)
+    # Projection(y, x): eta on the y axis, pt on the x axis, including the under/overflow bins
+    histo = cube.Projection(1, 0, 'EO')
+    for i_axis in [2, 3, 4]:
+        cube.GetAxis(i_axis).SetRange()
+
+    histo.SetName(histo_name)
+    histo.SetDirectory(0)
+    return histo
+
+def main(input_file, output_dir, year, n_workers, efficiency_interval, min_effective_entries, export, incremental, groups, normalized_inputs):
+    groups = reading_groups(groups)
+    # several eras share the same ROOT session, the maps of each era are stored in OUTPUT_DIR/YEAR
+    for era in year:
+        print("\n===== Year: {}".format(era))
+        era_output_dir = os.path.join(output_dir, era) if len(year) > 1 else output_dir
+        processing_year(formatting_year_inputs(input_file, era, len(year)), era_output_dir, era, n_workers, efficiency_interval, min_effective_entries, export, incremental,
+                        groups, normalized_inputs)
+
+
+def processing_year(input_file, output_dir, year, n_workers, efficiency_interval, min_effective_entries, export, incremental,
+                    groups=None, normalized_inputs=False):
     # testing
     # input_file = "/nfs/dust/cms/user/gmilella/ttX_ntuplizer/sgn_2018_hotvr/merged/ttX_mass1250_width4_ntuplizer_output.root"
     # input_file = "/nfs/dust/cms/user/gmilella/ttX_ntuplizer/sgn_2018_central_hotvr/merged/TTZprimeToTT_M-750_Width4_output.root"
@@ -179,7 +805,10 @@ def main(input_file, output_dir, year):
     # input_file = "/nfs/dust/cms/user/gmilella/ttX_ntuplizer/data_2018_hotvr/merged/DoubleMuon_2018_B_output.root"
     # output_dir = ROOT_DIR
 
-    processor = Processor(input_file, output_dir, year)
+    input_files = expanding_input_files(input_file)
+    processor = Processor(input_files, output_dir, year, n_workers=n_workers, efficiency_interval=efficiency_interval,
+                          min_effective_entries=min_effective_entries, export=export, incremental=incremental,
+                          groups=groups, normalized_inputs=normalized_inputs)
     processor.process()
 
 
@@ -208,7 +837,7 @@ def parsing_file(file):
             PROCESS_NAME = match.group(1)
         else:
             print("No process name found.")
-            sys.exit()
+            sys.exit(1)
 
     return PROCESS_NAME
 
@@ -217,21 +846,40 @@ def parsing_file(file):
 def parse_args(argv=None):
     parser = ArgumentParser()
 
-    parser.add_argument('--input_file', type=str, required=True,
-        help="Input directory, where to find the h5 files")
+    parser.add_argument('--input_file', type=str, nargs='+', required=True,
+        help="Input root file(s): a hadd-ed file, or the analyzer outputs (files, glob patterns "
+             "or directories), which are merged without the need of hadd.")
     parser.add_argument('--output_dir', type=str,
         help="Top-level output directory. "
              "Will be created if not existing. "
              "If not provided, takes the input dir.")
-    parser.add_argument('--year', type=int, required=True,
-        help='Year of the samples.')
+    parser.add_argument('--year', type=str, nargs='+', required=True, choices=list(B_TAGGING_WP.keys()),
+        help="Year(s)/era(s) of the samples. With several eras, all of them are processed in the same job "
+             "and the '{year}' placeholder in the input paths is replaced by each era.")
+    parser.add_argument('--n_workers', type=int, default=multiprocessing.cpu_count(),
+        help='Number of processes used to merge the input files.')
+    parser.add_argument('--efficiency_interval', type=str, choices=EFFICIENCY_INTERVALS, default='clopper_pearson',
+        help='Binomial interval of the efficiencies (68.27%% CL), stored as efficiency_{flavor}_{WP}_down/up.')
+    parser.add_argument('--min_effective_entries', type=float, default=0,
+        help='If > 0, adjacent pt/eta bins are merged per flavor until each bin reaches this effective number of entries '
+             '(best used with the analyzer --fine_binning). The chosen binning is stored in {process}_efficiencyMap_binning.json.')
+    parser.add_argument('--export', type=str, nargs='*', default=[], choices=EXPORT_FORMATS,
+        help='Also export all the maps of the year in efficiencyMaps_{year}.npz (see btagging_efficiency_lookup.py) '
+             'and/or in a correctionlib JSON efficiencyMaps_{year}.json.')
+    parser.add_argument('--incremental', action='store_true',
+        help='Merge again only the processes whose analyzer outputs changed since the last run (efficiencyMaps/merged).')
+    parser.add_argument('--groups', type=str, default=None,
+        help='YAML file of process groups ({group: [process patterns]}): the maps of each group ({group}_efficiencyMap.root) '
+             'are computed from the sum of its processes scaled by xsec * lumi / sum of gen weights.')
+    parser.add_argument('--normalized_inputs', action='store_true',
+        help='The inputs are already normalized (analyzer --weighted): the processes of the groups are summed without scaling.')
 
     args = parser.parse_args(argv)
 
     # If output directory is not provided, assume we want the output to be
     # alongside the input directory.
     if args.output_dir is None:
-        args.output_dir = args.input_file
+        args.output_dir = args.input_file[0]
 
     # Return the options as a dictionary.
     return vars(args)
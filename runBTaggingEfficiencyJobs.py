@@ -0,0 +1,129 @@
+import os, sys
+import time
+import subprocess
+from multiprocessing.pool import ThreadPool
+from argparse import ArgumentParser
+
+from btagging_threads import available_cpus
+from btagging_manifest import naming_manifest
+from BTaggingEfficiencyMapAnalyzer import naming_output_file, parsing_file
+
+# local alternative to the HTCondor submission: the jobs of the condor job list
+# (condor_jobs_submission/BTaggingEfficiencies_condor_jobs.txt) run on this node,
+# n_workers analyzer processes at a time with n_threads implicit MT threads each
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ANALYZER = os.path.join(SCRIPT_DIR, 'BTaggingEfficiencyMapAnalyzer.py')
+MAP_MAKER = os.path.join(SCRIPT_DIR, 'makeBTaggingEfficiencyMap.py')
+JOBS_FILE = os.path.join(SCRIPT_DIR, 'condor_jobs_submission', 'BTaggingEfficiencies_condor_jobs.txt')
+EVENT_SELECTION = 'after2OS'
+
+
+def reading_jobs(jobs_file):
+    # one job per line: job name and comma-separated input files
+    jobs = []
+    with open(jobs_file) as jobs_f:
+        for line in jobs_f:
+            if not line.strip() or line.startswith('#'): continue
+            job_name, input_files = line.split(None, 1)
+            jobs.append((job_name, input_files.strip()))
+    if not jobs:
+        print("No jobs found in {}".format(jobs_file))
+        sys.exit(1)
+    return jobs
+
+
+def running_job(job):
+    # the job is run again (up to retries times) if the analyzer fails:
+    # non-zero exit status, or no complete output (the output and its manifest, written last)
+    job_name, command, log_path, retries, output_path = job
+    for attempt in range(retries + 1):
+        start = time.time()
+        with open(log_path, 'a') as log_file:
+            log_file.write("ARGS: {}\n(attempt {})\n".format(' '.join(command), attempt + 1))
+            log_file.flush()
+            return_code = subprocess.call(command, stdout=log_file, stderr=subprocess.STDOUT)
+        if return_code != 0:
+            status = 'failed ({})'.format(return_code)
+        elif not (os.path.isfile(output_path) and os.path.isfile(naming_manifest(output_path))):
+            status = 'failed (no output {})'.format(output_path)
+        else:
+            status = 'done'
+        print("{}: {} in {:.0f} s (attempt {})".format(job_name, status, time.time() - start, attempt + 1))
+        if status == 'done':
+            return job_name, True
+    return job_name, False
+
+
+def main(jobs_file, output_dir, year, n_workers, n_threads, retries, log_dir, incremental, merge):
+    jobs = reading_jobs(jobs_file)
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+
+    job_commands = []
+    for job_name, input_files in jobs:
+        command = [sys.executable, ANALYZER, '--input_file', input_files, '--output_dir', output_dir,
+                   '--year', year, '--n_threads', str(n_threads)]
+        if incremental: command.append('--incremental')
+        # output expected from the analyzer (the files of a job belong to one process)
+        job_files = input_files.split(',')
+        output_path = naming_output_file(job_files, parsing_file(job_files[0]), output_dir, year)
+        job_commands.append((job_name, command, os.path.join(log_dir, 'log_{}.out'.format(job_name)), retries, output_path))
+
+    print("{} jobs: {} workers x {} threads".format(len(jobs), n_workers, n_threads))
+    # the jobs are separate processes: the pool threads only wait for them
+    pool = ThreadPool(n_workers)
+    try:
+        results = pool.map(running_job, job_commands, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    failed_jobs = [job_name for job_name, succeeded in results if not succeeded]
+    if failed_jobs:
+        print("{} failed jobs (see {}): {}".format(len(failed_jobs), log_dir, ' '.join(failed_jobs)))
+        sys.exit(1)
+
+    if merge:
+        # merge of the outputs and efficiency maps
+        command = [sys.executable, MAP_MAKER, '--input_file', os.path.join(output_dir, year, EVENT_SELECTION),
+                   '--year', year, '--output_dir', output_dir, '--n_workers', str(n_workers * n_threads)]
+        if incremental: command.append('--incremental')
+        print("Merging: {}".format(' '.join(command)))
+        if subprocess.call(command) != 0:
+            print("Merge failed")
+            sys.exit(1)
+
+
+def parse_args(argv=None):
+    parser = ArgumentParser()
+
+    parser.add_argument('--jobs_file', type=str, default=JOBS_FILE,
+        help="Job list written by condor_jobs_submission/BTaggingEfficiencies_condor_template.py "
+             "(one line per job: job name and comma-separated input files).")
+    parser.add_argument('--output_dir', type=str, required=True,
+        help="Top-level output directory of the analyzer.")
+    parser.add_argument('--year', type=str, required=True,
+        help="Year/era of the samples.")
+    parser.add_argument('--n_threads', type=int, default=1,
+        help="Implicit MT threads of each job.")
+    parser.add_argument('--n_workers', type=int, default=0,
+        help="Number of jobs running at the same time. If 0 (default), number of available cpus / n_threads.")
+    parser.add_argument('--retries', type=int, default=2,
+        help="Number of times a failed job is run again.")
+    parser.add_argument('--log_dir', type=str, default=os.path.join(os.getcwd(), 'log'),
+        help="Directory of the job logs.")
+    parser.add_argument('--incremental', action='store_true',
+        help="Skip the jobs (and merges) whose outputs are up to date.")
+    parser.add_argument('--merge', action='store_true',
+        help="Run makeBTaggingEfficiencyMap.py on the outputs once all the jobs succeeded.")
+
+    args = parser.parse_args(argv)
+    if args.n_workers <= 0:
+        args.n_workers = max(1, available_cpus() // max(1, args.n_threads))
+
+    return vars(args)
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(**args)
@@ -0,0 +1,86 @@
+import os, sys
+import math
+import types
+
+# the tests cover the pure python parts of the package: ROOT is replaced by a stub when not installed,
+# the tests needing some of it give their own fake objects
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+sys.path.insert(0, os.path.join(PACKAGE_DIR, 'condor_jobs_submission'))
+
+try:
+    import ROOT
+except ImportError:
+    sys.modules['ROOT'] = types.ModuleType('ROOT')
+
+
+def erf_inverse(y):
+    # bisection on math.erf, enough for the tests
+    low, high = -10., 10.
+    for _ in range(200):
+        middle = (low + high) / 2.
+        if math.erf(middle) < y: low = middle
+        else: high = middle
+    return (low + high) / 2.
+
+
+def fake_root(**attributes):
+    # namespace standing for the ROOT module in the tested functions
+    root = types.SimpleNamespace(TMath=types.SimpleNamespace(ErfInverse=erf_inverse))
+    for name, value in attributes.items():
+        setattr(root, name, value)
+    return root
+
+
+class FakeAxis:
+    def __init__(self, edges):
+        self.edges = list(edges)
+
+    def GetNbins(self):
+        return len(self.edges) - 1
+
+    def GetBinLowEdge(self, i):
+        return self.edges[i - 1]
+
+    def GetBinUpEdge(self, i):
+        return self.edges[i]
+
+
+class FakeHisto:
+    # TH2D of the map-maker: contents and sums of squared weights of all the cells (under/overflow included)
+    def __init__(self, name, x_edges, y_edges, contents, sumw2=None, entries=0):
+        import numpy as np
+        self.name, self.x_axis, self.y_axis = name, FakeAxis(x_edges), FakeAxis(y_edges)
+        self.contents = np.asarray(contents, dtype=np.float64)
+        self.sumw2 = None if sumw2 is None else np.asarray(sumw2, dtype=np.float64)
+        self.entries = entries
+
+    def GetName(self):
+        return self.name
+
+    def GetTitle(self):
+        return self.name
+
+    def ClassName(self):
+        return 'TH2D'
+
+    def GetNcells(self):
+        return (self.x_axis.GetNbins() + 2) * (self.y_axis.GetNbins() + 2)
+
+    def GetArray(self):
+        return self.contents
+
+    def GetSumw2N(self):
+        return 0 if self.sumw2 is None else len(self.sumw2)
+
+    def GetSumw2(self):
+        return types.SimpleNamespace(GetArray=lambda: self.sumw2)
+
+    def GetXaxis(self):
+        return self.x_axis
+
+    def GetYaxis(self):
+        return self.y_axis
+
+    def GetEntries(self):
+        return self.entries
@@ -0,0 +1,87 @@
+import os, sys
+import shutil
+
+import pytest
+
+import btagging_build
+from conftest import fake_root
+
+
+class FakeSystem:
+    def __init__(self):
+        self.compiled = []
+
+    def GetBuildArch(self):
+        return 'linuxx8664gcc'
+
+    def GetBuildCompilerVersion(self):
+        return '8.4.0 (x86_64)'
+
+    def AddIncludePath(self, include_path):
+        pass
+
+    def CompileMacro(self, source_path, options, library_name, build_dir):
+        self.compiled.append(source_path)
+        return 1
+
+
+@pytest.fixture
+def root(monkeypatch):
+    # imported by loading_compiled_header
+    root = fake_root(gROOT=fake_root(GetVersion=lambda: '6.20/07'), gSystem=FakeSystem())
+    monkeypatch.setitem(sys.modules, 'ROOT', root)
+    return root
+
+
+@pytest.fixture
+def header(tmp_path):
+    header_path = str(tmp_path / 'helpers.h')
+    with open(header_path, 'w') as header_file:
+        header_file.write('int f() { return 1; }\n')
+    return header_path
+
+
+def test_naming_root_build(root):
+    assert btagging_build.naming_root_build(root) == 'root-6.20.07_linuxx8664gcc_8.4.0..x86_64.'
+
+
+def test_naming_compiled_source(header, tmp_path):
+    source_path = btagging_build.naming_compiled_source(header, str(tmp_path / 'build'))
+    assert os.path.basename(source_path).startswith('helpers_')
+
+    # a modified header gets a new library
+    with open(header, 'a') as header_file:
+        header_file.write('int g() { return 2; }\n')
+    assert btagging_build.naming_compiled_source(header, str(tmp_path / 'build')) != source_path
+
+
+def test_loading_compiled_header(root, header, tmp_path):
+    build_dir = str(tmp_path / 'build')
+    assert btagging_build.loading_compiled_header(header, build_dir)
+    assert btagging_build.loading_compiled_header(header, build_dir)
+
+    # one copy of the header per ROOT build, compiled (or only loaded if up to date) by ACLiC
+    source_path = btagging_build.naming_compiled_source(header, os.path.join(build_dir, btagging_build.naming_root_build(root)))
+    assert os.path.isfile(source_path)
+    assert root.gSystem.compiled == [source_path, source_path]
+
+
+def test_default_build_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv(btagging_build.BUILD_DIR_ENV, str(tmp_path))
+    assert btagging_build.default_build_dir() == str(tmp_path)
+    monkeypatch.delenv(btagging_build.BUILD_DIR_ENV)
+    assert btagging_build.default_build_dir().endswith(os.path.join('.cache', 'btagging'))
+
+
+def test_unusable_build_dir(root, header, tmp_path, monkeypatch):
+    # the headers are then declared to the interpreter by the analyzer
+    not_a_dir = str(tmp_path / 'file')
+    with open(not_a_dir, 'w') as f:
+        f.write('x')
+    assert not btagging_build.loading_compiled_header(header, not_a_dir)
+
+    def failing_copy(source, destination):
+        raise IOError(30, 'Read-only file system')
+    monkeypatch.setattr(shutil, 'copyfile', failing_copy)
+    assert not btagging_build.loading_compiled_header(header, str(tmp_path / 'build'))
+    assert not root.gSystem.compiled
@@ -0,0 +1,133 @@
+import os
+import pickle
+from collections import OrderedDict
+
+import pytest
+
+import BTaggingEfficiencyMapAnalyzer as analyzer
+import makeBTaggingEfficiencyMap as make_map
+from conftest import fake_root
+
+
+class CountHisto:
+    # histogram reduced to a number of entries
+    def __init__(self, entries):
+        self.entries = entries
+
+    def Clone(self):
+        return CountHisto(self.entries)
+
+    def Add(self, other):
+        self.entries += other.entries
+
+    def SetDirectory(self, directory):
+        pass
+
+    def Write(self, name):
+        FakeFile.current.objects[name] = self
+
+
+class BookedResult:
+    def __init__(self, histo):
+        self.histo = histo
+
+    def GetValue(self):
+        return self.histo
+
+
+class FakeNamed:
+    def __init__(self, name, title):
+        self.name, self.title = name, title
+
+    def GetTitle(self):
+        return self.title
+
+    def Write(self):
+        FakeFile.current.objects[self.name] = self
+
+
+class FakeFile:
+    # the objects written in the file are pickled on disk when it is closed
+    current = None
+
+    def __init__(self, path, mode='READ'):
+        self.path, self.objects = path, {}
+        if mode == 'READ':
+            with open(path, 'rb') as root_file:
+                self.objects = pickle.load(root_file)
+
+    @classmethod
+    def Open(cls, path, mode='READ'):
+        try:
+            return cls(path, mode)
+        except Exception:
+            return None
+
+    def IsZombie(self):
+        return False
+
+    def cd(self):
+        FakeFile.current = self
+
+    def Get(self, name):
+        return self.objects.get(name)
+
+    def Close(self):
+        if not os.path.exists(self.path):
+            with open(self.path, 'wb') as root_file:
+                pickle.dump(self.objects, root_file)
+
+
+@pytest.fixture(autouse=True)
+def root(monkeypatch):
+    monkeypatch.setattr(analyzer, 'ROOT', fake_root(TFile=FakeFile, TNamed=FakeNamed))
+
+
+def test_checkpoint_is_not_an_output(tmp_path):
+    output_path = str(tmp_path / 'tt_dilepton_BTaggingEfficiencyMapAnalyzer_output.root')
+    checkpoint_path = analyzer.naming_checkpoint(output_path)
+    for path in [output_path, checkpoint_path]:
+        with open(path, 'w') as f:
+            f.write('x')
+
+    assert checkpoint_path.startswith(output_path)
+    assert make_map.expanding_input_files([str(tmp_path)]) == [output_path]
+
+
+def test_adding_results():
+    booked_histos = OrderedDict([('ee', [BookedResult(CountHisto(1)), BookedResult(CountHisto(2))]), ('mumu', [BookedResult(CountHisto(3))])])
+    histos = analyzer.adding_results(None, booked_histos)
+    assert [[histo.entries for histo in dir_histos] for dir_histos in histos.values()] == [[1, 2], [3]]
+
+    # the next blocks are added, booked results or histograms read from a checkpoint
+    booked_histos = OrderedDict([('ee', [CountHisto(10), BookedResult(CountHisto(20))]), ('mumu', [CountHisto(30)])])
+    histos = analyzer.adding_results(histos, booked_histos)
+    assert [[histo.entries for histo in dir_histos] for dir_histos in histos.values()] == [[11, 22], [33]]
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint_path = analyzer.naming_checkpoint(str(tmp_path / 'output.root'))
+    histos = OrderedDict([('ee', [CountHisto(1), CountHisto(2)]), ('nominal/mumu', [CountHisto(3)])])
+    analyzer.writing_checkpoint(checkpoint_path, histos, 2000000, 'key')
+
+    assert os.listdir(str(tmp_path)) == [os.path.basename(checkpoint_path)]
+    read_histos, processed_entries = analyzer.reading_checkpoint(checkpoint_path, 'key')
+    assert processed_entries == 2000000
+    assert list(read_histos.keys()) == ['ee', 'nominal/mumu']
+    assert [[histo.entries for histo in dir_histos] for dir_histos in read_histos.values()] == [[1, 2], [3]]
+
+
+def test_checkpoint_of_other_inputs(tmp_path):
+    checkpoint_path = analyzer.naming_checkpoint(str(tmp_path / 'output.root'))
+    assert analyzer.reading_checkpoint(checkpoint_path, 'key') == (None, 0)
+
+    analyzer.writing_checkpoint(checkpoint_path, OrderedDict([('ee', [CountHisto(1)])]), 1000000, 'key')
+    assert analyzer.reading_checkpoint(checkpoint_path, 'other key') == (None, 0)
+
+
+def test_unreadable_checkpoint(tmp_path):
+    # e.g. a job evicted while the file system was being written
+    checkpoint_path = analyzer.naming_checkpoint(str(tmp_path / 'output.root'))
+    with open(checkpoint_path, 'w') as f:
+        f.write('truncated')
+    assert analyzer.reading_checkpoint(checkpoint_path, 'key') == (None, 0)
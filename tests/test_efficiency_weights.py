@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import makeBTaggingEfficiencyMap as make_map
+from BTaggingEfficiencyMapAnalyzer import jet_weight_column, weight_columns
+from conftest import FakeHisto, fake_root
+
+# cell of the only pt x eta bin of a 1 x 1 histogram (3 x 3 cells with under/overflow)
+CELL = 4
+
+
+@pytest.fixture(autouse=True)
+def root(monkeypatch):
+    monkeypatch.setattr(make_map, 'ROOT', fake_root())
+
+
+def single_bin_histo(name, sumw, sumw2=None):
+    contents = np.zeros(9)
+    contents[CELL] = sumw
+    if sumw2 is not None:
+        sumw2, value = np.zeros(9), sumw2
+        sumw2[CELL] = value
+    return FakeHisto(name, [20., 1000.], [0., 2.5], contents, sumw2)
+
+
+def test_jet_weight_column():
+    assert jet_weight_column('selectedJets_nominal_flavor_b', True) == ['selectedJets_nominal_flavor_b_weight']
+    assert jet_weight_column('selectedJets_nominal_flavor_b', False) == []
+
+
+def test_weight_columns():
+    columns = weight_columns()
+    assert 'event_weight' not in columns
+    assert 'trigger_weight_nominal' in columns
+    assert columns == sorted(set(columns))
+
+
+def test_weighted_efficiency_uses_effective_entries():
+    # sum of weights 10 and sum of squared weights 25: 4 effective entries, 2 of them passing
+    efficiency_maps = make_map.computing_efficiency_maps(
+        [[single_bin_histo('num', 5., 12.5)]], [single_bin_histo('den', 10., 25.)], 'wilson')
+    down, up = make_map.binomial_intervals(np.array(2.), np.array(4.), 'wilson')
+
+    assert efficiency_maps['efficiency'][0, 0, CELL] == pytest.approx(0.5)
+    assert efficiency_maps['down'][0, 0, CELL] == pytest.approx(down)
+    assert efficiency_maps['up'][0, 0, CELL] == pytest.approx(up)
+    assert efficiency_maps['error'][0, 0, CELL] == pytest.approx((up - down) / 2.)
+
+
+def test_unweighted_efficiency_uses_entries():
+    # without sum of squared weights the contents are the numbers of entries
+    efficiency_maps = make_map.computing_efficiency_maps(
+        [[single_bin_histo('num', 3.)]], [single_bin_histo('den', 12.)], 'wilson')
+    down, up = make_map.binomial_intervals(np.array(3.), np.array(12.), 'wilson')
+
+    assert efficiency_maps['efficiency'][0, 0, CELL] == pytest.approx(0.25)
+    assert efficiency_maps['down'][0, 0, CELL] == pytest.approx(down)
+    assert efficiency_maps['up'][0, 0, CELL] == pytest.approx(up)
+
+
+def test_empty_bins_have_no_interval():
+    efficiency_maps = make_map.computing_efficiency_maps(
+        [[single_bin_histo('num', 0.)]], [single_bin_histo('den', 0., 0.)], 'wilson')
+    for values in ['efficiency', 'down', 'up', 'error']:
+        assert not efficiency_maps[values].any()
+
+
+@pytest.mark.parametrize('interval', ['wilson', pytest.param('clopper_pearson', marks=pytest.mark.skipif(
+    make_map.beta_distribution is None, reason='scipy not available'))])
+def test_binomial_intervals(interval):
+    k, n = np.array([0., 3., 10.]), np.array([10., 10., 10.])
+    down, up = make_map.binomial_intervals(k, n, interval)
+
+    assert np.all((0. <= down) & (down <= k / n) & (k / n <= up) & (up <= 1.))
+    assert down[0] == pytest.approx(0.)
+    assert up[2] == pytest.approx(1.)
@@ -0,0 +1,119 @@
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import makeBTaggingEfficiencyMap as make_map
+from btagging_metadata import load_yaml
+from conftest import FakeHisto, fake_root
+
+X_EDGES, Y_EDGES = [20., 50., 1000.], [0., 2.5]
+
+
+class SummedHisto:
+    # TH2D created by summing_histos
+    def __init__(self, name, title, n_bins_x, x_edges, n_bins_y, y_edges):
+        self.name, self.x_edges, self.y_edges = name, list(x_edges), list(y_edges)
+
+    def GetName(self):
+        return self.name
+
+    def SetDirectory(self, directory):
+        pass
+
+    def SetContent(self, contents):
+        self.contents = np.array(contents)
+
+    def SetError(self, errors):
+        self.errors = np.array(errors)
+
+    def SetEntries(self, entries):
+        self.entries = entries
+
+
+@pytest.fixture(autouse=True)
+def root(monkeypatch, tmp_path):
+    monkeypatch.setattr(make_map, 'ROOT', fake_root(TH2D=SummedHisto))
+    # metadata cache of the tests
+    monkeypatch.setattr(make_map, 'load_yaml', lambda path: load_yaml(path, cache_dir=str(tmp_path / 'cache')))
+
+
+def histo(name, sumw, sumw2, entries=1):
+    # 2 pt bins x 1 eta bin: 4 x 3 cells
+    return FakeHisto(name, X_EDGES, Y_EDGES, np.full(12, sumw), np.full(12, sumw2), entries)
+
+
+def test_reading_groups(tmp_path):
+    groups_file = str(tmp_path / 'groups.yaml')
+    with open(groups_file, 'w') as f:
+        f.write("dy: 'dy_ht_*'\ntt: [tt_dilepton, tt_semileptonic]\n")
+
+    assert make_map.reading_groups(None) == OrderedDict()
+    assert make_map.reading_groups(groups_file) == OrderedDict([('dy', ['dy_ht_*']), ('tt', ['tt_dilepton', 'tt_semileptonic'])])
+
+
+def test_summing_histos():
+    summed_histo = make_map.summing_histos([histo('a', 1., 1., 10), histo('b', 2., 4., 5)], [3., 0.5], 'group')
+
+    assert summed_histo.GetName() == 'group'
+    assert summed_histo.x_edges == X_EDGES and summed_histo.y_edges == Y_EDGES
+    np.testing.assert_allclose(summed_histo.contents, 3. * 1. + 0.5 * 2.)
+    # the sums of squared weights are scaled by the square of the scales
+    np.testing.assert_allclose(summed_histo.errors, np.sqrt(9. * 1. + 0.25 * 4.))
+    assert summed_histo.entries == 15
+
+
+def test_summing_histos_of_other_binnings():
+    other_binning = FakeHisto('b', [20., 1000.], Y_EDGES, np.zeros(9), np.zeros(9))
+    with pytest.raises(SystemExit):
+        make_map.summing_histos([histo('a', 1., 1.), other_binning], [1., 1.], 'group')
+
+
+def map_maker(groups, normalized_inputs=True, year='2018'):
+    processor = make_map.Processor.__new__(make_map.Processor)
+    processor.groups, processor.normalized_inputs, processor.year = groups, normalized_inputs, year
+    return processor
+
+
+def test_normalizing_processes(tmp_path, monkeypatch):
+    xsec_file, sum_gen_weights_file = str(tmp_path / 'xsec.yaml'), str(tmp_path / 'sum_gen_weights_{year}.yaml')
+    with open(xsec_file, 'w') as f:
+        f.write("tt_dilepton: {xSec: 88.3, isUsed: true}\ndy: {xSec: 6000., isUsed: false}\n")
+    with open(sum_gen_weights_file.format(year='2018'), 'w') as f:
+        f.write("tt_dilepton: 1000.\ndy: 1000.\n")
+    monkeypatch.setattr(make_map, 'XSEC_FILE', xsec_file)
+    monkeypatch.setattr(make_map, 'SUM_GEN_WEIGHTS_FILE', sum_gen_weights_file)
+
+    scales = map_maker(OrderedDict(), normalized_inputs=False)._normalizing_processes(['tt_dilepton'])
+    assert scales['tt_dilepton'] == pytest.approx(88.3 * make_map.LUMINOSITY['2018'] / 1000.)
+    assert map_maker(OrderedDict())._normalizing_processes(['tt_dilepton']) == {'tt_dilepton': 1.}
+    # process not used in the analysis
+    with pytest.raises(SystemExit):
+        map_maker(OrderedDict(), normalized_inputs=False)._normalizing_processes(['dy'])
+
+
+def test_grouping_processes():
+    def process_histos(process, sumw):
+        return {'b': {'no_btagged': histo(process + '_ak4_flavor_b_etaVSpt_after_2OS_ee', sumw, sumw),
+                      'medium': histo(process + '_ak4_btagged_WP_medium_flavor_b_etaVSpt_after_2OS_ee', sumw / 2., sumw / 2.)}}
+
+    processor = map_maker(OrderedDict([('dy', ['dy_ht_*']), ('tt', ['tt_*']), ('missing', ['qcd_*'])]))
+    processor.all_bkgs = OrderedDict([
+        ('all', OrderedDict([('dy_ht_100to200', process_histos('dy_ht_100to200', 1.)), ('dy_ht_200to400', process_histos('dy_ht_200to400', 2.)),
+                             ('tt_dilepton', process_histos('tt_dilepton', 4.))])),
+        ('ee', OrderedDict([('tt_dilepton', process_histos('tt_dilepton', 4.))])),
+    ])
+    processor._grouping_processes()
+
+    assert list(processor.all_bkgs['all'].keys()) == ['dy_ht_100to200', 'dy_ht_200to400', 'tt_dilepton', 'dy', 'tt']
+    assert list(processor.all_bkgs['ee'].keys()) == ['tt_dilepton', 'tt']
+    dy_histo = processor.all_bkgs['all']['dy']['b']['medium']
+    assert dy_histo.GetName() == 'dy_ak4_btagged_WP_medium_flavor_b_etaVSpt_after_2OS_ee'
+    np.testing.assert_allclose(dy_histo.contents, 1.5)
+
+
+def test_group_with_the_name_of_a_process():
+    processor = map_maker(OrderedDict([('tt_dilepton', ['tt_*'])]))
+    processor.all_bkgs = OrderedDict([('all', OrderedDict([('tt_dilepton', {})]))])
+    with pytest.raises(SystemExit):
+        processor._grouping_processes()
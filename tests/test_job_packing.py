@@ -0,0 +1,84 @@
+import os
+import ast
+import glob
+from collections import OrderedDict
+
+import pytest
+
+from BTaggingEfficiencyMapAnalyzer import EVENT_SELECTION
+from btagging_manifest import MANIFEST_SUFFIX, reading_manifest, recording_output
+from conftest import PACKAGE_DIR
+
+TEMPLATE = os.path.join(PACKAGE_DIR, 'condor_jobs_submission', 'BTaggingEfficiencies_condor_template.py')
+
+
+def loading_template_functions(*names):
+    # the condor template is a script (arguments parsed and jobs written when run): only its functions are taken
+    with open(TEMPLATE) as template_file:
+        tree = ast.parse(template_file.read(), TEMPLATE)
+    module = ast.Module(body=[node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name in names],
+                        type_ignores=[])
+    namespace = {'os': os, 'glob': glob, 'OrderedDict': OrderedDict, 'EVENT_SELECTION': EVENT_SELECTION,
+                 'MANIFEST_SUFFIX': MANIFEST_SUFFIX, 'reading_manifest': reading_manifest}
+    exec(compile(module, TEMPLATE, 'exec'), namespace)
+    return [namespace[name] for name in names]
+
+
+packing_files, reading_packed_jobs = loading_template_functions('packing_files', 'reading_packed_jobs')
+
+
+def test_packing_files():
+    files_entries = [('a', 600), ('b', 300), ('c', 1500), ('d', 400), ('e', 200)]
+    jobs = packing_files(files_entries, 1000)
+
+    # every file once, a file larger than events_per_job alone in its job
+    assert sorted(input_file for job in jobs for input_file in job) == ['a', 'b', 'c', 'd', 'e']
+    assert ['c'] in jobs
+    entries = dict(files_entries)
+    for job in jobs:
+        assert len(job) == 1 or sum(entries[input_file] for input_file in job) <= 1000
+
+
+def test_packing_files_keeps_previous_jobs():
+    previous_jobs = [(900, ['a', 'b']), (400, ['c'])]
+    files_entries = [('a', 600), ('b', 300), ('c', 400), ('d', 500), ('e', 700)]
+    jobs = packing_files(files_entries, 1000, previous_jobs)
+
+    # the previous jobs keep their files (and their outputs their names), the new files fill them up to events_per_job
+    assert jobs[0] == ['a', 'b']
+    assert jobs[1] == ['c', 'd']
+    assert jobs[2:] == [['e']]
+
+
+def recording_job(outputs_dir, name, job_files, process, mtime):
+    output_path = os.path.join(outputs_dir, name)
+    with open(output_path, 'w') as output_file:
+        output_file.write('x')
+    recording_output(output_path, job_files, 'config', process=process)
+    os.utime(output_path + MANIFEST_SUFFIX, (mtime, mtime))
+
+
+def test_reading_packed_jobs(tmp_path):
+    input_files = []
+    for i in range(5):
+        input_files.append(str(tmp_path / 'chunk_{}.root'.format(i)))
+        with open(input_files[-1], 'w') as input_file:
+            input_file.write('x')
+    outputs_dir = os.path.join(str(tmp_path), '2018', EVENT_SELECTION)
+    os.makedirs(outputs_dir)
+
+    recording_job(outputs_dir, 'new.root', input_files[:2], 'tt_dilepton', 3000)
+    # superseded by the newer job
+    recording_job(outputs_dir, 'old.root', input_files[1:3], 'tt_dilepton', 1000)
+    recording_job(outputs_dir, 'other.root', input_files[3:4], 'tt_dilepton', 2000)
+    # process not submitted
+    recording_job(outputs_dir, 'dy.root', input_files[4:], 'dy', 2000)
+
+    files_by_process = {'tt_dilepton': input_files[:4]}
+    assert reading_packed_jobs(str(tmp_path), 2018, files_by_process) == OrderedDict(
+        [('tt_dilepton', [input_files[:2], input_files[3:4]])])
+
+    # the jobs with inputs no longer found are packed again, the older job of the remaining inputs is kept
+    files_by_process = {'tt_dilepton': input_files[1:4]}
+    assert reading_packed_jobs(str(tmp_path), 2018, files_by_process) == OrderedDict(
+        [('tt_dilepton', [input_files[3:4], input_files[1:3]])])
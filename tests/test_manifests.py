@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+import makeBTaggingEfficiencyMap as make_map
+from btagging_manifest import naming_manifest, reading_manifest, is_up_to_date, removing_manifest, recording_output, \
+    superseded_outputs, removing_output
+
+
+def writing_file(path, content='x'):
+    with open(str(path), 'w') as f:
+        f.write(content)
+    return str(path)
+
+
+def recording(output_path, input_files, process='tt_dilepton', mtime=None):
+    writing_file(output_path)
+    recording_output(output_path, input_files, 'config', process=process)
+    if mtime is not None:
+        os.utime(output_path, (mtime, mtime))
+    return output_path
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    return [writing_file(tmp_path / 'chunk_{}.root'.format(i)) for i in range(4)]
+
+
+def test_recording_output(tmp_path, inputs):
+    output_path = recording(str(tmp_path / 'output.root'), inputs[:2])
+    manifest = reading_manifest(output_path)
+
+    assert manifest['config_hash'] == 'config'
+    assert manifest['process'] == 'tt_dilepton'
+    assert list(manifest['inputs'].keys()) == [os.path.abspath(input_file) for input_file in inputs[:2]]
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp')]
+
+
+def test_is_up_to_date(tmp_path, inputs):
+    output_path = recording(str(tmp_path / 'output.root'), inputs[:2])
+
+    assert is_up_to_date(output_path, inputs[:2], 'config')
+    assert not is_up_to_date(output_path, inputs[:2], 'other config')
+    assert not is_up_to_date(output_path, inputs[:3], 'config')
+
+    # modified input
+    writing_file(inputs[0], 'modified')
+    assert not is_up_to_date(output_path, inputs[:2], 'config')
+
+
+def test_missing_output_or_manifest(tmp_path, inputs):
+    output_path = recording(str(tmp_path / 'output.root'), inputs[:2])
+    removing_manifest(output_path)
+    assert reading_manifest(output_path) is None
+    assert not is_up_to_date(output_path, inputs[:2], 'config')
+
+    output_path = recording(str(tmp_path / 'other_output.root'), inputs[:2])
+    os.remove(output_path)
+    assert not is_up_to_date(output_path, inputs[:2], 'config')
+
+
+def test_superseded_outputs(tmp_path, inputs):
+    old_output = recording(str(tmp_path / 'old.root'), inputs[:2])
+    recording(str(tmp_path / 'other_process.root'), inputs[:2], process='dy')
+    recording(str(tmp_path / 'other_inputs.root'), inputs[3:])
+    new_output = str(tmp_path / 'new.root')
+
+    assert superseded_outputs(new_output, inputs[1:3], 'tt_dilepton') == [old_output]
+    assert superseded_outputs(old_output, inputs[:2], 'tt_dilepton') == []
+
+
+def test_removing_output(tmp_path, inputs):
+    # glob characters in the name of the output
+    output_path = recording(str(tmp_path / 'output[1].root'), inputs[:1])
+    writing_file(output_path + '.profile.json')
+    other_output = recording(str(tmp_path / 'output1.root'), inputs[1:2])
+
+    removing_output(output_path)
+    assert sorted(os.listdir(str(tmp_path))) == sorted(
+        [os.path.basename(path) for path in inputs] + ['output1.root', os.path.basename(naming_manifest(other_output))])
+
+
+def test_dropping_superseded_outputs(tmp_path, inputs):
+    # the newest outputs are kept, an older one with all its inputs in them is skipped
+    newest = recording(str(tmp_path / 'newest.root'), inputs[:2], mtime=3000)
+    new = recording(str(tmp_path / 'new.root'), inputs[2:], mtime=2000)
+    old = recording(str(tmp_path / 'old.root'), inputs[1:3], mtime=1000)
+    without_manifest = writing_file(tmp_path / 'without_manifest.root')
+
+    output_files = [old, new, newest, without_manifest]
+    assert make_map.dropping_superseded_outputs('tt_dilepton', output_files) == [new, newest, without_manifest]
+
+
+def test_dropping_partly_superseded_outputs(tmp_path, inputs):
+    # an older output with only some of its inputs in the newer ones cannot be merged
+    newest = recording(str(tmp_path / 'newest.root'), inputs[:2], mtime=2000)
+    old = recording(str(tmp_path / 'old.root'), inputs[1:3], mtime=1000)
+
+    with pytest.raises(SystemExit):
+        make_map.dropping_superseded_outputs('tt_dilepton', [old, newest])